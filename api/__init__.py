@@ -1,4 +1,8 @@
 # API模块包初始化文件
 from .user_info import get_user_info_with_retry
 from .relation_stat import get_relation_stat_with_retry
-from .upstat import get_upstat_with_retry# API初始化
\ No newline at end of file
+from .upstat import get_upstat_with_retry
+from .client import get_session, configure_client, close_client
+from .retry import RetryPolicy, DEFAULT_RETRY_POLICY
+from .errors import ApiError, TransportError, ServerError, RiskControlError, PermanentError
+# API初始化
\ No newline at end of file
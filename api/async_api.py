@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import os
+from .async_client import get_async_session, aiohttp
+from .errors import ApiError, TransportError, ServerError, RiskControlError, check_http_status, check_api_payload
+from .rate_limit import bucket_for_url
+from .retry import DEFAULT_RETRY_POLICY
+from .user_info import (USER_INFO_URL, IMAGE_CHUNK_SIZE, IMAGE_REVALIDATE_INTERVAL, extract_user_info,
+                        collect_user_image_tasks, conditional_headers)
+from .relation_stat import RELATION_STAT_URL, extract_relation_stat
+from .upstat import UPSTAT_URL, extract_upstat
+from storage import get_image_store
+
+async def _fetch_json_async(url, params, headers):
+    """
+    异步请求B站API，成功时返回完整响应数据，失败时抛出分类后的ApiError
+    """
+    session = get_async_session()
+    bucket = bucket_for_url(url)
+    await bucket.acquire_async()
+    try:
+        async with session.get(url, params=params, headers=headers) as response:
+            check_http_status(response.status, response.reason or '')
+            data = await response.json(content_type=None)
+        data = check_api_payload(data)
+    except RiskControlError:
+        # 触发风控时降低该接口的请求速率
+        bucket.on_risk_control()
+        raise
+    except ApiError:
+        raise
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        raise TransportError(str(e) or e.__class__.__name__)
+    except ValueError as e:
+        raise ServerError(f"响应不是有效的JSON: {e}")
+    bucket.on_success()
+    return data
+
+async def _get_json_async(url, params, headers):
+    """
+    异步请求B站API，成功时返回完整响应数据，失败返回None
+    """
+    try:
+        return await _fetch_json_async(url, params, headers)
+    except ApiError as e:
+        print(f"{e.label}: {e}")
+        return None
+    except Exception as e:
+        print(f"处理数据时出错: {e}")
+        return None
+
+async def get_user_info_async(mid, headers):
+    """
+    异步获取用户基本信息
+    """
+    return await _get_json_async(USER_INFO_URL, {'mid': mid}, headers)
+
+async def get_relation_stat_async(mid, headers):
+    """
+    异步获取用户的关注和粉丝数量
+    """
+    return await _get_json_async(RELATION_STAT_URL, {'vmid': mid}, headers)
+
+async def get_upstat_async(mid, headers):
+    """
+    异步获取用户的播放量和点赞数量
+    """
+    return await _get_json_async(UPSTAT_URL, {'mid': mid}, headers)
+
+async def _stream_to_file_async(response, path):
+    """
+    分块把响应内容写入文件，同时计算SHA-256，返回 (内容哈希, 字节数)
+    写文件放到线程池，避免阻塞事件循环
+    """
+    loop = asyncio.get_running_loop()
+    hasher = hashlib.sha256()
+    size = 0
+    f = await loop.run_in_executor(None, open, path, 'wb')
+    try:
+        async for chunk in response.content.iter_chunked(IMAGE_CHUNK_SIZE):
+            await loop.run_in_executor(None, f.write, chunk)
+            hasher.update(chunk)
+            size += len(chunk)
+    except BaseException:
+        f.close()
+        os.remove(path)
+        raise
+    f.close()
+    return hasher.hexdigest(), size
+
+async def download_user_image_async(mid, kind, url, ext, headers):
+    """
+    异步下载用户的一张图片到内容寻址存储，同一URL或相同内容的图片只保存一份
+    """
+    loop = asyncio.get_running_loop()
+    store = get_image_store()
+    if await loop.run_in_executor(None, store.link_url, mid, kind, url, IMAGE_REVALIDATE_INTERVAL):
+        print(f"图片已存在，跳过下载: {url}")
+        return True
+
+    try:
+        session = get_async_session()
+        # 已保存过的图片发送条件请求，未修改时服务器返回304，不重新下载
+        validators = await loop.run_in_executor(None, store.get_validators, url)
+        await bucket_for_url(url).acquire_async()
+        async with session.get(url, headers=conditional_headers(headers, validators)) as response:
+            if response.status == 304:
+                if await loop.run_in_executor(None, store.mark_not_modified, mid, kind, url):
+                    print(f"图片未修改，跳过下载: {url}")
+                    return True
+                # 图片在此期间被删除，重新完整下载
+                return await download_user_image_async(mid, kind, url, ext, headers)
+            response.raise_for_status()
+            temp_path = store.temp_path()
+            content_hash, size = await _stream_to_file_async(response, temp_path)
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+
+        # 写索引放到线程池，避免阻塞事件循环
+        content_hash = await loop.run_in_executor(None, store.store_file, mid, kind, url, temp_path,
+                                                  content_hash, size, ext, etag, last_modified)
+        print(f"图片已下载: {store.asset_path(content_hash, ext)}")
+        return True
+
+    except Exception as e:
+        print(f"下载图片失败 {url}: {e}")
+        return False
+
+async def download_user_images_async(mid, user_data, headers):
+    """
+    并发下载用户头像、头像框和勋章图片
+    """
+    tasks = collect_user_image_tasks(mid, user_data)
+    await asyncio.get_running_loop().run_in_executor(
+        None, get_image_store().retain, mid, [kind for kind, _, _ in tasks])
+    if tasks:
+        await asyncio.gather(*[download_user_image_async(mid, kind, url, ext, headers)
+                               for kind, url, ext in tasks])
+
+async def _with_retry_async(url, params, extract, headers, retry_policy=None, on_result=None):
+    """
+    异步重试：等待期间只挂起当前协程，不占用线程
+    """
+    async def attempt():
+        result = await _fetch_json_async(url, params, headers)
+        
+        # 提取指定数据
+        extracted_data = extract(result)
+        if not extracted_data:
+            raise ServerError("响应缺少data字段")
+        
+        if on_result:
+            on_result(result)
+        return extracted_data
+
+    try:
+        return await (retry_policy or DEFAULT_RETRY_POLICY).call_async(attempt)
+    except ApiError:
+        return None
+
+async def get_user_info_with_retry_async(mid, headers, retry_policy=None):
+    """
+    带重试功能的异步用户信息查询，同时下载用户图片，返回提取后的数据
+    """
+    image_tasks = []
+
+    def schedule_images(result):
+        image_tasks.append(asyncio.ensure_future(download_user_images_async(mid, result, headers)))
+
+    extracted_data = await _with_retry_async(USER_INFO_URL, {'mid': mid}, extract_user_info, headers,
+                                             retry_policy, on_result=schedule_images)
+    if image_tasks:
+        await asyncio.gather(*image_tasks)
+    return extracted_data
+
+async def get_relation_stat_with_retry_async(mid, headers, retry_policy=None):
+    """
+    带重试功能的异步关注粉丝数量查询
+    """
+    return await _with_retry_async(RELATION_STAT_URL, {'vmid': mid}, extract_relation_stat, headers,
+                                   retry_policy)
+
+async def get_upstat_with_retry_async(mid, headers, retry_policy=None):
+    """
+    带重试功能的异步播放点赞数量查询
+    """
+    return await _with_retry_async(UPSTAT_URL, {'mid': mid}, extract_upstat, headers,
+                                   retry_policy)
+
+async def fetch_user_data_async(mid, headers):
+    """
+    在同一个事件循环中并发查询三个接口并下载图片
+    返回 (user_info, relation_stat, upstat_data)，查询失败的部分为None
+    """
+    return tuple(await asyncio.gather(
+        get_user_info_with_retry_async(mid, headers),
+        get_relation_stat_with_retry_async(mid, headers),
+        get_upstat_with_retry_async(mid, headers),
+    ))
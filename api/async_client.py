@@ -0,0 +1,79 @@
+import asyncio
+import threading
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from . import client
+
+# 异步连接池配置
+ASYNC_POOL_LIMIT = 200          # 同时保持的最大连接数
+ASYNC_POOL_LIMIT_PER_HOST = 50  # 每个主机的最大连接数
+DNS_CACHE_TTL = 300             # DNS缓存时间（秒）
+
+# 事件循环 -> (aiohttp会话, 随事件循环关闭会话的异步生成器)
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def _create_async_session():
+    """
+    创建带连接池的aiohttp会话，超时设置与同步客户端保持一致
+    """
+    connector = aiohttp.TCPConnector(limit=ASYNC_POOL_LIMIT,
+                                     limit_per_host=ASYNC_POOL_LIMIT_PER_HOST,
+                                     ttl_dns_cache=DNS_CACHE_TTL)
+    timeout = aiohttp.ClientTimeout(sock_connect=client.CONNECT_TIMEOUT,
+                                    sock_read=client.READ_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+async def _close_with_loop(loop, session):
+    """
+    asyncio.run() 关闭事件循环前会关闭所有未结束的异步生成器，此时执行finally关闭会话
+    """
+    try:
+        yield
+    finally:
+        with _sessions_lock:
+            if _sessions.get(loop, (None,))[0] is session:
+                del _sessions[loop]
+        if not session.closed:
+            await session.close()
+
+def _drop_closed_loops():
+    """
+    移除已关闭事件循环的会话（事件循环没有通过asyncio.run()正常结束时），避免事件循环和会话一直无法释放
+    """
+    for loop in [loop for loop in _sessions if loop.is_closed()]:
+        del _sessions[loop]
+
+def get_async_session():
+    """
+    获取当前事件循环共享的aiohttp会话（aiohttp会话不能跨事件循环使用），
+    会话在事件循环结束时自动关闭
+    """
+    if aiohttp is None:
+        raise RuntimeError("异步API需要安装aiohttp: pip install aiohttp")
+
+    loop = asyncio.get_running_loop()
+    with _sessions_lock:
+        _drop_closed_loops()
+        entry = _sessions.get(loop)
+        if entry is not None and not entry[0].closed:
+            return entry[0]
+        session = _create_async_session()
+        # 事件循环只保存异步生成器的弱引用，由_sessions持有
+        guard = _close_with_loop(loop, session)
+        _sessions[loop] = (session, guard)
+    asyncio.ensure_future(guard.__anext__())
+    return session
+
+async def close_async_session():
+    """
+    关闭当前事件循环的aiohttp会话
+    """
+    with _sessions_lock:
+        entry = _sessions.pop(asyncio.get_running_loop(), None)
+    if entry is not None and not entry[0].closed:
+        await entry[0].close()
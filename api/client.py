@@ -0,0 +1,102 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from .errors import TransportError, ServerError, RiskControlError, check_http_status, check_api_payload
+from .rate_limit import bucket_for_url
+
+# 连接池配置
+POOL_CONNECTIONS = 4    # 缓存的主机连接池数量（api.bilibili.com、图片CDN等）
+POOL_MAXSIZE = 16       # 每个主机连接池保持的最大连接数
+CONNECT_TIMEOUT = 3.05  # 建立连接超时（秒）
+READ_TIMEOUT = 10       # 读取响应超时（秒）
+
+_session = None
+_session_lock = threading.Lock()
+
+def _create_session(pool_connections, pool_maxsize):
+    """
+    创建带连接池的Session，复用TCP+TLS连接
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def get_session():
+    """
+    获取全局共享的HTTP Session（线程安全，首次调用时创建）
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _create_session(POOL_CONNECTIONS, POOL_MAXSIZE)
+    return _session
+
+def get_timeout():
+    """
+    获取 (连接超时, 读取超时) 元组
+    """
+    return (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+def configure_client(pool_connections=None, pool_maxsize=None, connect_timeout=None, read_timeout=None):
+    """
+    修改连接池大小和超时设置，已有的Session会被关闭并在下次请求时重建
+    """
+    global _session, POOL_CONNECTIONS, POOL_MAXSIZE, CONNECT_TIMEOUT, READ_TIMEOUT
+    with _session_lock:
+        if pool_connections is not None:
+            POOL_CONNECTIONS = pool_connections
+        if pool_maxsize is not None:
+            POOL_MAXSIZE = pool_maxsize
+        if connect_timeout is not None:
+            CONNECT_TIMEOUT = connect_timeout
+        if read_timeout is not None:
+            READ_TIMEOUT = read_timeout
+        if _session is not None:
+            _session.close()
+            _session = None
+
+def http_get(url, params=None, headers=None, **kwargs):
+    """
+    通过共享Session发送GET请求，请求前按接口限速
+    """
+    kwargs.setdefault('timeout', get_timeout())
+    bucket_for_url(url).acquire()
+    return get_session().get(url, params=params, headers=headers, **kwargs)
+
+def fetch_api_json(url, params=None, headers=None):
+    """
+    请求B站API并检查返回状态，成功时返回完整响应数据，
+    失败时抛出分类后的ApiError供重试策略判断
+    """
+    try:
+        response = http_get(url, params=params, headers=headers)
+    except requests.exceptions.RequestException as e:
+        raise TransportError(str(e))
+
+    bucket = bucket_for_url(url)
+    try:
+        check_http_status(response.status_code, response.reason or '')
+        try:
+            data = response.json()
+        except ValueError as e:
+            raise ServerError(f"响应不是有效的JSON: {e}")
+        data = check_api_payload(data)
+    except RiskControlError:
+        # 触发风控时降低该接口的请求速率
+        bucket.on_risk_control()
+        raise
+    bucket.on_success()
+    return data
+
+def close_client():
+    """
+    关闭共享Session，释放连接池
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
@@ -0,0 +1,78 @@
+# B站API错误分类，重试策略根据错误类型决定是否重试以及等待多久
+
+# 风控相关错误码：请求被拦截，需要放慢速度后再试
+RISK_CONTROL_CODES = {-412, -352, -799, -509}
+# 永久性错误码：用户不存在、参数错误等，重试没有意义
+PERMANENT_CODES = {-404, -400, -626}
+
+class ApiError(Exception):
+    """
+    API请求失败的基类
+    """
+    label = "API返回错误"
+    retryable = False
+
+    def __init__(self, message, code=None, status=None):
+        super().__init__(message)
+        self.code = code
+        self.status = status
+
+class TransportError(ApiError):
+    """
+    网络层错误：连接失败、超时等
+    """
+    label = "网络请求失败"
+    retryable = True
+
+class ServerError(ApiError):
+    """
+    服务端错误：HTTP 5xx或响应数据不完整
+    """
+    label = "服务器错误"
+    retryable = True
+
+class RiskControlError(ApiError):
+    """
+    触发B站风控（-412/-352/-799等）
+    """
+    label = "触发风控"
+    retryable = True
+
+class PermanentError(ApiError):
+    """
+    永久性错误：用户不存在、参数错误等
+    """
+    label = "API返回错误"
+    retryable = False
+
+def check_http_status(status, reason=''):
+    """
+    根据HTTP状态码抛出对应的错误
+    """
+    if status < 400:
+        return
+    message = f"HTTP {status} {reason}".strip()
+    if status in (412, 429):
+        raise RiskControlError(message, status=status)
+    if status >= 500:
+        raise ServerError(message, status=status)
+    raise PermanentError(message, status=status)
+
+def check_api_payload(data):
+    """
+    检查B站API返回的code字段，成功时返回数据，否则抛出对应的错误
+    """
+    if not isinstance(data, dict):
+        raise ServerError("响应格式错误")
+
+    code = data.get('code')
+    if code == 0:
+        return data
+
+    message = data.get('message', '未知错误')
+    if code in RISK_CONTROL_CODES:
+        raise RiskControlError(message, code=code)
+    if code in PERMANENT_CODES:
+        raise PermanentError(message, code=code)
+    # 其他错误码通常是接口层面的业务错误，不重试
+    raise ApiError(message, code=code)
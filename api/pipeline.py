@@ -0,0 +1,79 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from .user_info import USER_INFO_URL, get_user_info_with_retry, collect_user_image_tasks, download_user_image
+from .relation_stat import RELATION_STAT_URL, get_relation_stat_with_retry
+from .upstat import UPSTAT_URL, get_upstat_with_retry
+from .rate_limit import endpoint_for_url
+from storage import get_image_store
+
+# 并发查询使用的线程数：每个限速桶（接口）使用独立的线程池，
+# 等待某个接口令牌的任务只占用该接口的线程，不阻塞其他接口和图片下载
+FETCH_WORKERS = {
+    'acc_info': 8,
+    'relation_stat': 8,
+    'upstat': 8,
+    'image': 16,
+}
+DEFAULT_FETCH_WORKERS = 8
+
+_executors = {}
+_executor_lock = threading.Lock()
+
+def get_executor(endpoint):
+    """
+    获取指定接口共享的查询线程池（endpoint与rate_limit中的限速桶名称相同）
+    """
+    executor = _executors.get(endpoint)
+    if executor is None:
+        with _executor_lock:
+            executor = _executors.get(endpoint)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS.get(endpoint, DEFAULT_FETCH_WORKERS),
+                                              thread_name_prefix=f'bili-fetch-{endpoint}')
+                _executors[endpoint] = executor
+    return executor
+
+def submit_request(url, func, *args, **kwargs):
+    """
+    把请求url的任务提交到该URL所属接口的线程池
+    """
+    return get_executor(endpoint_for_url(url)).submit(func, *args, **kwargs)
+
+def fetch_user_data(mid, headers):
+    """
+    并发查询用户基本信息、关注粉丝数量和播放点赞数量，
+    用户信息返回后立即并发下载头像、头像框和勋章图片
+    返回 (user_info, relation_stat, upstat_data)，查询失败的部分为None
+    """
+    image_futures = []
+
+    def submit_image_downloads(mid, user_data, headers):
+        # 在用户信息返回后把每张图片作为独立任务提交，不阻塞其他查询
+        tasks = collect_user_image_tasks(mid, user_data)
+        get_image_store().retain(mid, [kind for kind, _, _ in tasks])
+        for kind, url, ext in tasks:
+            image_futures.append(submit_request(url, download_user_image, mid, kind, url, ext, headers))
+
+    user_info_future = submit_request(USER_INFO_URL, get_user_info_with_retry, mid, headers,
+                                      image_downloader=submit_image_downloads)
+    relation_future = submit_request(RELATION_STAT_URL, get_relation_stat_with_retry, mid, headers)
+    upstat_future = submit_request(UPSTAT_URL, get_upstat_with_retry, mid, headers)
+
+    user_info = user_info_future.result()
+    relation_stat = relation_future.result()
+    upstat_data = upstat_future.result()
+
+    # 等待图片下载完成，保证后续绘制卡片时图片已存在
+    wait(image_futures)
+
+    return user_info, relation_stat, upstat_data
+
+def merge_user_data(user_info, relation_stat, upstat_data):
+    """
+    合并三个接口的查询结果
+    """
+    combined_data = {}
+    for part in (user_info, relation_stat, upstat_data):
+        if part:
+            combined_data.update(part)
+    return combined_data
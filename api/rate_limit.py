@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+from urllib.parse import urlsplit
+
+# 各接口的速率配置：rate为初始每秒请求数，burst为桶容量，
+# min_rate/max_rate为自适应调整的范围
+ENDPOINT_LIMITS = {
+    'acc_info': {'rate': 2.0, 'burst': 4, 'min_rate': 0.2, 'max_rate': 5.0},
+    'relation_stat': {'rate': 4.0, 'burst': 8, 'min_rate': 0.5, 'max_rate': 10.0},
+    'upstat': {'rate': 2.0, 'burst': 4, 'min_rate': 0.2, 'max_rate': 5.0},
+    'image': {'rate': 20.0, 'burst': 40, 'min_rate': 2.0, 'max_rate': 50.0},
+    'default': {'rate': 2.0, 'burst': 4, 'min_rate': 0.2, 'max_rate': 5.0},
+}
+
+# B站接口路径与限速桶的对应关系
+ENDPOINT_PATHS = {
+    '/x/space/acc/info': 'acc_info',
+    '/x/relation/stat': 'relation_stat',
+    '/x/space/upstat': 'upstat',
+}
+
+# AIMD参数：每次成功请求加性增加的速率，触发风控时速率的乘性系数
+ADDITIVE_INCREASE = 0.05
+MULTIPLICATIVE_DECREASE = 0.5
+DECREASE_COOLDOWN = 1.0  # 两次降速之间的最短间隔（秒），避免同一批请求连续降速
+
+class AdaptiveTokenBucket:
+    """
+    自适应令牌桶：按rate补充令牌，成功时缓慢提速，触发风控时成倍降速（AIMD）
+    """
+
+    def __init__(self, rate, burst, min_rate, max_rate):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.last_decrease = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """
+        预订一个令牌，返回需要等待的秒数（令牌可以透支，等待时间由透支量决定）
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        """
+        阻塞直到获得令牌
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """
+        acquire的异步版本
+        """
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_success(self):
+        """
+        请求成功：加性提速
+        """
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + ADDITIVE_INCREASE)
+
+    def on_risk_control(self):
+        """
+        触发风控：乘性降速，并清空已积累的令牌
+        """
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_decrease < DECREASE_COOLDOWN:
+                return
+            self.last_decrease = now
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * MULTIPLICATIVE_DECREASE)
+            self.tokens = min(self.tokens, 0.0)
+            print(f"触发风控，限速调整为 {self.rate:.2f} 次/秒")
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def get_bucket(endpoint):
+    """
+    获取指定接口的令牌桶（进程内共享）
+    """
+    bucket = _buckets.get(endpoint)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.get(endpoint)
+            if bucket is None:
+                limits = ENDPOINT_LIMITS.get(endpoint, ENDPOINT_LIMITS['default'])
+                bucket = AdaptiveTokenBucket(**limits)
+                _buckets[endpoint] = bucket
+    return bucket
+
+def endpoint_for_url(url):
+    """
+    根据URL判断所属的限速桶：API按路径区分，其他主机（图片CDN）统一归为image
+    """
+    parts = urlsplit(url)
+    if parts.hostname == 'api.bilibili.com':
+        return ENDPOINT_PATHS.get(parts.path.rstrip('/'), 'default')
+    return 'image'
+
+def bucket_for_url(url):
+    """
+    获取URL对应的令牌桶
+    """
+    return get_bucket(endpoint_for_url(url))
@@ -0,0 +1,93 @@
+import asyncio
+import random
+import time
+from .errors import ApiError, RiskControlError
+
+class RetryPolicy:
+    """
+    共享的重试策略：指数退避 + 随机抖动 + 总耗时上限，
+    只重试网络错误、服务端错误和风控错误，永久性错误立即放弃
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=8.0, multiplier=2.0,
+                 jitter=0.5, deadline=15.0, risk_control_delay=2.0):
+        self.max_attempts = max_attempts              # 最多尝试次数（包含第一次）
+        self.base_delay = base_delay                  # 第一次重试前的等待时间（秒）
+        self.max_delay = max_delay                    # 单次等待时间上限（秒）
+        self.multiplier = multiplier                  # 每次重试等待时间的倍数
+        self.jitter = jitter                          # 随机抖动比例，0表示不抖动
+        self.deadline = deadline                      # 从第一次请求开始的总耗时上限（秒）
+        self.risk_control_delay = risk_control_delay  # 触发风控时的基础等待时间（秒）
+
+    def should_retry(self, error):
+        """
+        判断错误是否值得重试
+        """
+        return isinstance(error, ApiError) and error.retryable
+
+    def compute_delay(self, attempt, error):
+        """
+        计算第attempt次失败后的等待时间（attempt从1开始）
+        """
+        base = self.risk_control_delay if isinstance(error, RiskControlError) else self.base_delay
+        delay = min(self.max_delay, base * (self.multiplier ** (attempt - 1)))
+        if self.jitter:
+            delay *= 1 - self.jitter * random.random()
+        return delay
+
+    def _next_delay(self, attempt, error, started):
+        """
+        返回下一次重试前的等待时间，不应再重试时返回None
+        """
+        print(f"{error.label}: {error}")
+
+        if not self.should_retry(error):
+            print("错误不可重试，放弃查询")
+            return None
+
+        if attempt >= self.max_attempts:
+            print(f"经过 {self.max_attempts} 次尝试后仍失败，放弃查询")
+            return None
+
+        delay = self.compute_delay(attempt, error)
+        if self.deadline is not None and time.monotonic() - started + delay > self.deadline:
+            print(f"超过总耗时上限 {self.deadline} 秒，放弃查询")
+            return None
+
+        print(f"等待 {delay:.1f} 秒后重试... ({attempt}/{self.max_attempts})")
+        return delay
+
+    def call(self, func, *args, **kwargs):
+        """
+        按策略调用func，成功返回结果，最终失败时抛出最后一次的ApiError
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return func(*args, **kwargs)
+            except ApiError as e:
+                delay = self._next_delay(attempt, e, started)
+                if delay is None:
+                    raise
+            time.sleep(delay)
+
+    async def call_async(self, func, *args, **kwargs):
+        """
+        call的异步版本，等待期间只挂起当前协程
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await func(*args, **kwargs)
+            except ApiError as e:
+                delay = self._next_delay(attempt, e, started)
+                if delay is None:
+                    raise
+            await asyncio.sleep(delay)
+
+# 所有API默认使用的重试策略
+DEFAULT_RETRY_POLICY = RetryPolicy()
@@ -0,0 +1,28 @@
+import asyncio
+import pytest
+from api import async_client
+
+pytestmark = pytest.mark.skipif(async_client.aiohttp is None, reason="需要安装aiohttp")
+
+
+async def _get_session():
+    session = async_client.get_async_session()
+    assert async_client.get_async_session() is session
+    await asyncio.sleep(0)
+    return session
+
+
+def test_session_closed_with_loop():
+    session = asyncio.run(_get_session())
+    assert session.closed
+    assert not async_client._sessions
+
+
+def test_closed_loop_dropped():
+    # 没有通过asyncio.run()结束的事件循环，在下次获取会话时移除
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(_get_session())
+    loop.close()
+    assert loop in async_client._sessions
+    asyncio.run(_get_session())
+    assert loop not in async_client._sessions
@@ -0,0 +1,52 @@
+import threading
+import pytest
+from api import pipeline
+
+
+@pytest.fixture
+def executors(monkeypatch):
+    monkeypatch.setattr(pipeline, '_executors', {})
+    yield
+    for executor in pipeline._executors.values():
+        executor.shutdown(wait=False)
+
+
+def test_waiting_endpoint_does_not_block_others(executors, monkeypatch):
+    release = threading.Event()
+    finished = {}
+
+    def record(name):
+        def func(mid, headers):
+            finished[(name, mid)] = True
+            return {}
+        return func
+    monkeypatch.setattr(pipeline, 'get_user_info_with_retry',
+                        lambda mid, headers, image_downloader: release.wait(5) and None)
+    monkeypatch.setattr(pipeline, 'get_relation_stat_with_retry', record('relation'))
+    monkeypatch.setattr(pipeline, 'get_upstat_with_retry', record('upstat'))
+
+    # 用户信息接口的线程全部在等待令牌
+    blockers = [pipeline.get_executor('acc_info').submit(release.wait, 5)
+                for _ in range(pipeline.FETCH_WORKERS['acc_info'])]
+    query = threading.Thread(target=pipeline.fetch_user_data, args=(2, {}))
+    query.start()
+    try:
+        for _ in range(100):
+            if ('relation', 2) in finished and ('upstat', 2) in finished:
+                break
+            query.join(0.01)
+        # 其他接口的请求不需要等待用户信息接口的线程
+        assert ('relation', 2) in finished
+        assert ('upstat', 2) in finished
+    finally:
+        release.set()
+        query.join(5)
+        for blocker in blockers:
+            blocker.result(5)
+
+
+def test_requests_routed_by_endpoint(executors):
+    assert pipeline.submit_request(pipeline.USER_INFO_URL, threading.current_thread).result().name.startswith(
+        'bili-fetch-acc_info')
+    assert pipeline.submit_request('https://i0.hdslb.com/bfs/face/a.jpg', threading.current_thread).result().name.startswith(
+        'bili-fetch-image')
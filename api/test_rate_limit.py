@@ -0,0 +1,83 @@
+import pytest
+from api import rate_limit
+from api.rate_limit import AdaptiveTokenBucket, ADDITIVE_INCREASE, DECREASE_COOLDOWN
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, 'monotonic', clock.monotonic)
+    return clock
+
+
+@pytest.fixture
+def bucket(clock):
+    return AdaptiveTokenBucket(rate=2.0, burst=4, min_rate=0.2, max_rate=5.0)
+
+
+def test_burst_then_wait(bucket):
+    assert [bucket.reserve() for _ in range(4)] == [0.0] * 4
+    # 令牌用完后按透支量计算等待时间
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_refill_capped_at_burst(bucket, clock):
+    for _ in range(4):
+        bucket.reserve()
+    clock.now += 100
+    assert [bucket.reserve() for _ in range(4)] == [0.0] * 4
+    assert bucket.reserve() > 0
+
+
+def test_additive_increase(bucket):
+    for _ in range(10):
+        bucket.on_success()
+    assert bucket.rate == pytest.approx(2.0 + 10 * ADDITIVE_INCREASE)
+
+
+def test_increase_capped_at_max_rate(bucket):
+    for _ in range(1000):
+        bucket.on_success()
+    assert bucket.rate == 5.0
+
+
+def test_multiplicative_decrease_drains_tokens(bucket, clock):
+    bucket.on_risk_control()
+    assert bucket.rate == pytest.approx(1.0)
+    # 已积累的令牌被清空，下一个请求需要等待
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_decrease_cooldown(bucket, clock):
+    bucket.on_risk_control()
+    bucket.on_risk_control()
+    assert bucket.rate == pytest.approx(1.0)
+    clock.now += DECREASE_COOLDOWN
+    bucket.on_risk_control()
+    assert bucket.rate == pytest.approx(0.5)
+
+
+def test_decrease_floored_at_min_rate(bucket, clock):
+    for _ in range(20):
+        clock.now += DECREASE_COOLDOWN
+        bucket.on_risk_control()
+    assert bucket.rate == 0.2
+
+
+@pytest.mark.parametrize('url, endpoint', [
+    ('https://api.bilibili.com/x/space/acc/info?mid=2', 'acc_info'),
+    ('https://api.bilibili.com/x/relation/stat/', 'relation_stat'),
+    ('https://api.bilibili.com/x/unknown', 'default'),
+    ('https://i0.hdslb.com/bfs/face/a.jpg', 'image'),
+])
+def test_endpoint_for_url(url, endpoint):
+    assert rate_limit.endpoint_for_url(url) == endpoint
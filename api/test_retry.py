@@ -0,0 +1,147 @@
+import asyncio
+import pytest
+from api import retry
+from api.errors import (ApiError, TransportError, ServerError, RiskControlError, PermanentError,
+                        check_http_status, check_api_payload)
+from api.retry import RetryPolicy
+
+
+@pytest.mark.parametrize('status, error', [
+    (412, RiskControlError),
+    (429, RiskControlError),
+    (500, ServerError),
+    (503, ServerError),
+    (404, PermanentError),
+])
+def test_check_http_status(status, error):
+    with pytest.raises(error) as info:
+        check_http_status(status)
+    assert info.value.status == status
+
+
+def test_check_http_status_ok():
+    check_http_status(200)
+    check_http_status(304)
+
+
+@pytest.mark.parametrize('payload, error', [
+    ({'code': -412, 'message': '请求被拦截'}, RiskControlError),
+    ({'code': -352}, RiskControlError),
+    ({'code': -404}, PermanentError),
+    ({'code': -101}, ApiError),
+    (None, ServerError),
+])
+def test_check_api_payload(payload, error):
+    with pytest.raises(error) as info:
+        check_api_payload(payload)
+    assert type(info.value) is error
+
+
+def test_check_api_payload_ok():
+    payload = {'code': 0, 'data': {}}
+    assert check_api_payload(payload) is payload
+
+
+class FakeClock:
+    """
+    替换time.monotonic和time.sleep，sleep只推进时间并记录等待时长
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(retry.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(retry.time, 'sleep', clock.sleep)
+    return clock
+
+
+def failing(errors, result='ok'):
+    """
+    依次抛出errors中的错误，之后返回result
+    """
+    errors = list(errors)
+    calls = []
+
+    def func():
+        calls.append(1)
+        if errors:
+            raise errors.pop(0)
+        return result
+    func.calls = calls
+    return func
+
+
+def test_exponential_backoff(clock):
+    policy = RetryPolicy(max_attempts=4, base_delay=1.0, multiplier=2.0, max_delay=3.0, jitter=0, deadline=None)
+    func = failing([TransportError('超时')] * 3)
+    assert policy.call(func) == 'ok'
+    # 1, 2, 4 -> 受max_delay限制为3
+    assert clock.sleeps == [1.0, 2.0, 3.0]
+
+
+def test_risk_control_uses_longer_base_delay(clock):
+    policy = RetryPolicy(base_delay=0.5, risk_control_delay=2.0, jitter=0, deadline=None)
+    policy.call(failing([RiskControlError('风控')]))
+    assert clock.sleeps == [2.0]
+
+
+def test_jitter_only_shortens_delay():
+    policy = RetryPolicy(base_delay=1.0, jitter=0.5)
+    for _ in range(100):
+        assert 0.5 <= policy.compute_delay(1, ServerError('')) <= 1.0
+
+
+def test_permanent_error_not_retried(clock):
+    func = failing([PermanentError('用户不存在')])
+    with pytest.raises(PermanentError):
+        RetryPolicy().call(func)
+    assert len(func.calls) == 1
+    assert clock.sleeps == []
+
+
+def test_gives_up_after_max_attempts(clock):
+    func = failing([ServerError('HTTP 502')] * 5)
+    with pytest.raises(ServerError):
+        RetryPolicy(max_attempts=3, jitter=0, deadline=None).call(func)
+    assert len(func.calls) == 3
+
+
+def test_deadline_stops_retry(clock):
+    # 第二次等待（2秒）会超过2.5秒的总耗时上限
+    policy = RetryPolicy(max_attempts=10, base_delay=1.0, multiplier=2.0, jitter=0, deadline=2.5)
+    func = failing([TransportError('超时')] * 5)
+    with pytest.raises(TransportError):
+        policy.call(func)
+    assert clock.sleeps == [1.0]
+    assert len(func.calls) == 2
+
+
+def test_call_async(monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(delay):
+        sleeps.append(delay)
+    monkeypatch.setattr(retry.asyncio, 'sleep', fake_sleep)
+
+    errors = [ServerError('HTTP 503')]
+
+    async def func():
+        if errors:
+            raise errors.pop()
+        return 'ok'
+
+    policy = RetryPolicy(base_delay=1.0, jitter=0, deadline=None)
+    assert asyncio.run(policy.call_async(func)) == 'ok'
+    assert sleeps == [1.0]
@@ -0,0 +1,90 @@
+import pytest
+from api import user_info
+from storage import ImageStore
+
+URL = 'https://i0.hdslb.com/bfs/face/a.jpg'
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size):
+        yield self.content
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = ImageStore(str(tmp_path / 'assets'), str(tmp_path / 'assets' / 'index.db'))
+    monkeypatch.setattr(user_info, 'get_image_store', lambda: store)
+    return store
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """
+    按顺序返回预设的响应，并记录每次请求的请求头
+    """
+    responses = []
+    requests = []
+
+    def http_get(url, headers=None, stream=False):
+        requests.append(dict(headers or {}))
+        return responses.pop(0)
+    monkeypatch.setattr(user_info, 'http_get', http_get)
+    return responses, requests
+
+
+def test_download_records_validators(store, server):
+    responses, requests = server
+    responses.append(FakeResponse(200, b'image', {'ETag': '"v1"'}))
+    assert user_info.download_user_image(1, 'face', URL, '.jpg', {})
+    assert 'If-None-Match' not in requests[0]
+    assert store.get_validators(URL) == ('"v1"', None)
+    assert store.get_ref(1, 'face') is not None
+
+
+def test_fresh_image_not_requested(store, server):
+    responses, requests = server
+    responses.append(FakeResponse(200, b'image', {'ETag': '"v1"'}))
+    user_info.download_user_image(1, 'face', URL, '.jpg', {})
+    assert user_info.download_user_image(2, 'face', URL, '.jpg', {})
+    assert len(requests) == 1
+
+
+def test_stale_image_revalidated_with_304(store, server, monkeypatch):
+    responses, requests = server
+    responses.append(FakeResponse(200, b'image', {'ETag': '"v1"'}))
+    user_info.download_user_image(1, 'face', URL, '.jpg', {})
+
+    # 超过复用时间后发送条件请求，304时引用已保存的图片
+    monkeypatch.setattr(user_info, 'IMAGE_REVALIDATE_INTERVAL', -1)
+    responses.append(FakeResponse(304))
+    assert user_info.download_user_image(2, 'face', URL, '.jpg', {})
+    assert requests[1]['If-None-Match'] == '"v1"'
+    assert store.get_ref(2, 'face') == store.get_ref(1, 'face')
+
+
+def test_stale_image_replaced_with_200(store, server, monkeypatch):
+    responses, requests = server
+    responses.append(FakeResponse(200, b'old', {'ETag': '"v1"'}))
+    user_info.download_user_image(1, 'face', URL, '.jpg', {})
+    old_hash = store.get_ref(1, 'face')[0]
+
+    monkeypatch.setattr(user_info, 'IMAGE_REVALIDATE_INTERVAL', -1)
+    responses.append(FakeResponse(200, b'new', {'ETag': '"v2"'}))
+    assert user_info.download_user_image(1, 'face', URL, '.jpg', {})
+    assert store.get_ref(1, 'face')[0] != old_hash
+    assert store.get_validators(URL) == ('"v2"', None)
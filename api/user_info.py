@@ -1,61 +1,83 @@
-import requests
-import time
 import os
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from .client import http_get, fetch_api_json
+from .errors import ApiError, ServerError
+from .retry import DEFAULT_RETRY_POLICY
+from storage import get_image_store
+
+USER_INFO_URL = "https://api.bilibili.com/x/space/acc/info"
+
+# 下载B站CDN在服务端缩放后的缩略图（URL后缀 @{w}w_{h}h.webp），而不是原图
+USE_CDN_THUMBNAILS = True
+# 卡片布局需要的图片尺寸（同一类型在布局中出现多次时取最大的尺寸）
+THUMBNAIL_SIZES = {
+    'face': 100,       # 头像：圆形头像80px，图片网格100px
+    'pendant': 120,    # 头像框：头像尺寸+40px
+    'nameplate': 100   # 勋章：图片网格100px
+}
+THUMBNAIL_FORMAT = 'webp'
+# 支持缩略图后缀的CDN域名
+THUMBNAIL_HOST_SUFFIX = '.hdslb.com'
+
+# 下载图片时每次写入磁盘的块大小
+IMAGE_CHUNK_SIZE = 64 * 1024
+# 已下载的图片在这段时间（秒）内直接复用，超过后发送带ETag/Last-Modified的条件请求确认是否更新
+IMAGE_REVALIDATE_INTERVAL = 24 * 60 * 60
+
+def fetch_user_info(mid, headers):
+    """
+    获取用户基本信息，失败时抛出ApiError
+    API: https://api.bilibili.com/x/space/acc/info?mid={mid}
+    """
+    return fetch_api_json(USER_INFO_URL, {'mid': mid}, headers)
 
 def get_user_info(mid, headers):
     """
     获取用户基本信息
     API: https://api.bilibili.com/x/space/acc/info?mid={mid}
     """
-    url = f"https://api.bilibili.com/x/space/acc/info"
-    params = {
-        'mid': mid
-    }
-    
     try:
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        # 检查API返回状态
-        if data.get('code') == 0:
-            return data
-        else:
-            error_msg = data.get('message', '未知错误')
-            print(f"API返回错误: {error_msg}")
-            return None
-            
-    except requests.exceptions.RequestException as e:
-        print(f"网络请求失败: {e}")
+        return fetch_user_info(mid, headers)
+    except ApiError as e:
+        print(f"{e.label}: {e}")
         return None
     except Exception as e:
         print(f"处理数据时出错: {e}")
         return None
 
-def download_image(url, filepath, headers):
+def stream_to_file(response, path):
     """
-    下载图片到指定路径
+    分块把响应内容写入文件，同时计算SHA-256，返回 (内容哈希, 字节数)
     """
+    hasher = hashlib.sha256()
+    size = 0
     try:
-        if not url:
-            print(f"图片URL为空，跳过下载")
-            return False
-            
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        # 确保目录存在
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        
-        with open(filepath, 'wb') as f:
-            f.write(response.content)
-        
-        print(f"图片已下载: {filepath}")
-        return True
-        
-    except Exception as e:
-        print(f"下载图片失败 {url}: {e}")
-        return False
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(IMAGE_CHUNK_SIZE):
+                f.write(chunk)
+                hasher.update(chunk)
+                size += len(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return hasher.hexdigest(), size
+
+def conditional_headers(headers, validators):
+    """
+    在请求头中加入If-None-Match/If-Modified-Since，validators为 (ETag, Last-Modified) 或None
+    """
+    if not validators:
+        return headers
+    etag, last_modified = validators
+    headers = dict(headers or {})
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    return headers
 
 def extract_user_info(user_data):
     """
@@ -82,74 +104,131 @@ def extract_user_info(user_data):
     
     return extracted_info
 
-def download_user_images(mid, user_data, headers):
+def get_image_extension(url, default):
+    """
+    从URL中提取图片扩展名
+    """
+    file_extension = default
+    if '.' in url:
+        ext = url.split('.')[-1].split('?')[0]
+        if ext in ['jpg', 'jpeg', 'png', 'gif', 'webp']:
+            file_extension = f'.{ext}'
+    return file_extension
+
+def thumbnail_url(url, size, fmt=THUMBNAIL_FORMAT):
+    """
+    把B站CDN图片URL转换为服务端缩放后的缩略图URL，不是B站CDN的图片返回None
+    例如 https://i0.hdslb.com/bfs/face/xxx.jpg -> https://i0.hdslb.com/bfs/face/xxx.jpg@100w_100h.webp
     """
-    下载用户头像、头像框和勋章图片
+    parts = urlsplit(url)
+    if not parts.netloc.endswith(THUMBNAIL_HOST_SUFFIX) or not parts.path.startswith('/bfs/'):
+        return None
+    # 去掉URL中已有的缩放参数
+    path = parts.path.split('@')[0]
+    scheme = f"{parts.scheme}:" if parts.scheme else "https:"
+    return f"{scheme}//{parts.netloc}{path}@{size}w_{size}h.{fmt}"
+
+def image_task(kind, url, default_ext):
+    """
+    生成一张图片的下载任务 (类型, url, 扩展名)，开启USE_CDN_THUMBNAILS时下载布局所需尺寸的缩略图
+    """
+    if USE_CDN_THUMBNAILS and kind in THUMBNAIL_SIZES:
+        resized_url = thumbnail_url(url, THUMBNAIL_SIZES[kind])
+        if resized_url:
+            return kind, resized_url, f'.{THUMBNAIL_FORMAT}'
+    return kind, url, get_image_extension(url, default_ext)
+
+def collect_user_image_tasks(mid, user_data):
+    """
+    收集需要下载的用户图片，返回 [(类型, url, 扩展名), ...]
     """
     if not user_data or 'data' not in user_data:
-        return
+        return []
     
     data = user_data['data']
+    tasks = []
     
-    # 下载头像
+    # 头像
     face_url = data.get('face')
     if face_url:
-        # 从URL中提取文件扩展名
-        file_extension = '.jpg'  # 默认使用jpg
-        if '.' in face_url:
-            ext = face_url.split('.')[-1].split('?')[0]
-            if ext in ['jpg', 'jpeg', 'png', 'gif', 'webp']:
-                file_extension = f'.{ext}'
-        
-        face_path = f"img/{mid}_face{file_extension}"
-        download_image(face_url, face_path, headers)
+        tasks.append(image_task('face', face_url, '.jpg'))
     
-    # 下载头像框
+    # 头像框
     pendant_image_url = data.get('pendant', {}).get('image')
     if pendant_image_url:
-        # 从URL中提取文件扩展名
-        file_extension = '.png'  # 默认使用png
-        if '.' in pendant_image_url:
-            ext = pendant_image_url.split('.')[-1].split('?')[0]
-            if ext in ['jpg', 'jpeg', 'png', 'gif', 'webp']:
-                file_extension = f'.{ext}'
-        
-        pendant_path = f"img/{mid}_pendant{file_extension}"
-        download_image(pendant_image_url, pendant_path, headers)
+        tasks.append(image_task('pendant', pendant_image_url, '.png'))
     
-    # 下载勋章
+    # 勋章
     nameplate_image_url = data.get('nameplate', {}).get('image')
     if nameplate_image_url:
-        # 从URL中提取文件扩展名
-        file_extension = '.png'  # 默认使用png
-        if '.' in nameplate_image_url:
-            ext = nameplate_image_url.split('.')[-1].split('?')[0]
-            if ext in ['jpg', 'jpeg', 'png', 'gif', 'webp']:
-                file_extension = f'.{ext}'
+        tasks.append(image_task('nameplate', nameplate_image_url, '.png'))
+    
+    return tasks
+
+def download_user_image(mid, kind, url, ext, headers):
+    """
+    下载用户的一张图片到内容寻址存储，同一URL或相同内容的图片只保存一份
+    """
+    store = get_image_store()
+    if store.link_url(mid, kind, url, max_age=IMAGE_REVALIDATE_INTERVAL):
+        print(f"图片已存在，跳过下载: {url}")
+        return True
+    
+    try:
+        # 已保存过的图片发送条件请求，未修改时服务器返回304，不重新下载
+        validators = store.get_validators(url)
+        with http_get(url, headers=conditional_headers(headers, validators), stream=True) as response:
+            if response.status_code == 304 and store.mark_not_modified(mid, kind, url):
+                print(f"图片未修改，跳过下载: {url}")
+                return True
+            if response.status_code == 304:
+                # 图片在此期间被删除，重新完整下载
+                return download_user_image(mid, kind, url, ext, headers)
+            response.raise_for_status()
+            temp_path = store.temp_path()
+            content_hash, size = stream_to_file(response, temp_path)
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+        content_hash = store.store_file(mid, kind, url, temp_path, content_hash, size, ext, etag, last_modified)
+        print(f"图片已下载: {store.asset_path(content_hash, ext)}")
+        return True
         
-        nameplate_path = f"img/{mid}_nameplate{file_extension}"
-        download_image(nameplate_image_url, nameplate_path, headers)
+    except Exception as e:
+        print(f"下载图片失败 {url}: {e}")
+        return False
 
-def get_user_info_with_retry(mid, headers, max_retries=3, delay=3):
+def download_user_images(mid, user_data, headers):
+    """
+    并发下载用户头像、头像框和勋章图片
+    """
+    tasks = collect_user_image_tasks(mid, user_data)
+    if tasks:
+        with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix='bili-image') as executor:
+            for kind, url, ext in tasks:
+                executor.submit(download_user_image, mid, kind, url, ext, headers)
+    
+    # 释放用户已经不再使用的图片（例如取消了头像框）
+    get_image_store().retain(mid, [kind for kind, _, _ in tasks])
+
+def get_user_info_with_retry(mid, headers, retry_policy=None, image_downloader=download_user_images):
     """
     带重试功能的用户信息查询，返回提取后的数据
+    image_downloader(mid, user_data, headers) 负责下载用户图片，并发流水线会传入自己的调度函数
     """
-    for attempt in range(max_retries):
-        result = get_user_info(mid, headers)
-        if result:
-            # 下载用户图片
-            download_user_images(mid, result, headers)
-            
-            # 提取指定数据（不包含图片URL）
-            extracted_data = extract_user_info(result)
-            if extracted_data:
-                return extracted_data
+    def attempt():
+        result = fetch_user_info(mid, headers)
+        
+        # 提取指定数据（不包含图片URL）
+        extracted_data = extract_user_info(result)
+        if not extracted_data:
+            raise ServerError("响应缺少data字段")
         
-        # 如果不是最后一次尝试，则等待后重试
-        if attempt < max_retries - 1:
-            print(f"等待 {delay} 秒后重试... ({attempt + 1}/{max_retries})")
-            time.sleep(delay)
-        else:
-            print(f"经过 {max_retries} 次尝试后仍失败，放弃查询")
+        # 下载用户图片
+        if image_downloader:
+            image_downloader(mid, result, headers)
+        return extracted_data
     
-    return None
\ No newline at end of file
+    try:
+        return (retry_policy or DEFAULT_RETRY_POLICY).call(attempt)
+    except ApiError:
+        return None
\ No newline at end of file
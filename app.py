@@ -9,17 +9,9 @@ from collections import deque
 import threading
 
 # 导入API模块
-from api.user_info import get_user_info_with_retry
-from api.relation_stat import get_relation_stat_with_retry
-from api.upstat import get_upstat_with_retry
-# 修改绘图导入
-try:
-    from drawing import draw_user_card
-except ImportError:
-    # 回退到旧版本
-    from draw_user_card import draw_user_card
+from api.pipeline import fetch_user_data
 from web_api import run_web_api  # 导入Web API启动函数
-from common import manage_query_history, delete_user_data  # 导入共享功能
+from common import init_query_history, manage_query_history, update_history_size, delete_user_data, save_combined_data, render_user_card  # 导入共享功能
 
 def load_cookie():
     """
@@ -51,66 +43,26 @@ def create_headers(cookie):
     }
     return headers
 
-def save_combined_data(mid, user_info, relation_stat, upstat_data):
-    """
-    保存合并后的数据到一个文件
-    """
-    # 创建data目录
-    if not os.path.exists('data'):
-        os.makedirs('data')
-    
-    # 合并所有数据
-    combined_data = {}
-    
-    # 添加用户基本信息
-    if user_info:
-        combined_data.update(user_info)
-    
-    # 添加关系数据
-    if relation_stat:
-        combined_data.update(relation_stat)
-    
-    # 添加统计数据
-    if upstat_data:
-        combined_data.update(upstat_data)
-    
-    filename = f"data/{mid}_data.json"
-    
-    try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(combined_data, f, ensure_ascii=False, indent=2)
-        print(f"数据已保存到: {filename}")
-        return True
-    except Exception as e:
-        print(f"保存数据时出错: {e}")
-        return False
-
 def query_user_data(mid, headers):
     """
-    按顺序查询用户数据，每个API都有重试机制
+    并发查询用户数据，每个API都有重试机制
     """
     print(f"\n开始查询用户 {mid} 的数据...")
     
     # 管理查询历史记录
     manage_query_history(mid)
     
-    # 1. 查询用户基本信息（带重试）
-    print("1. 查询用户基本信息...")
-    user_info = get_user_info_with_retry(mid, headers)
+    # 1-3. 并发查询用户基本信息、关注粉丝数量、播放点赞数量（带重试）
+    print("1-3. 并发查询用户基本信息、关注粉丝数量、播放点赞数量...")
+    user_info, relation_stat, upstat_data = fetch_user_data(mid, headers)
     if not user_info:
-        print("用户基本信息查询失败，停止后续查询")
+        print("用户基本信息查询失败")
         return False
     
-    # 2. 查询关注和粉丝数量（带重试）
-    print("2. 查询关注和粉丝数量...")
-    relation_stat = get_relation_stat_with_retry(mid, headers)
     if not relation_stat:
-        print("关注粉丝数据查询失败，停止后续查询")
+        print("关注粉丝数据查询失败")
         return False
     
-    # 3. 查询播放和点赞数量（带重试）
-    print("3. 查询播放和点赞数量...")
-    upstat_data = get_upstat_with_retry(mid, headers)
     if not upstat_data:
         print("播放点赞数据查询失败")
         return False
@@ -121,7 +73,10 @@ def query_user_data(mid, headers):
     
     # 5. 生成用户信息卡片
     print("5. 生成用户信息卡片...")
-    draw_user_card(mid)
+    render_user_card(mid)
+    
+    # 更新磁盘占用，必要时淘汰其他用户数据
+    update_history_size(mid)
     
     print(f"\n用户 {mid} 的所有数据查询完成！")
     return True
@@ -190,6 +145,9 @@ def main():
     print("B站用户数据查询程序")
     print("=" * 50)
     
+    # 加载查询历史（之后只在内存中维护，后台定期写回文件）
+    init_query_history()
+    
     # 启动Web API服务
     start_web_api()
     
@@ -0,0 +1,108 @@
+# cache.py
+import threading
+from collections import OrderedDict
+
+# 用户数据缓存：最多缓存的用户数和总字节数
+RECORD_CACHE_MAX_ENTRIES = 4096
+RECORD_CACHE_MAX_BYTES = 16 * 1024 * 1024
+# 卡片图片缓存：最多缓存的卡片数和总字节数
+CARD_CACHE_MAX_ENTRIES = 512
+CARD_CACHE_MAX_BYTES = 128 * 1024 * 1024
+# 缩小尺寸的卡片缓存：最多缓存的图片数和总字节数
+VARIANT_CACHE_MAX_ENTRIES = 2048
+VARIANT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+class LRUCache:
+    """
+    线程安全的LRU缓存，同时限制条目数和总字节数
+    """
+
+    def __init__(self, max_entries, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value, size=0):
+        """
+        写入缓存，size为条目占用的字节数；单个条目超过字节上限时不缓存
+        """
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = (value, size)
+            self._bytes += size
+            self._evict()
+
+    def invalidate(self, key):
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def configure(self, max_entries=None, max_bytes=None):
+        """
+        修改缓存上限，超出部分立即淘汰
+        """
+        with self._lock:
+            if max_entries is not None:
+                self.max_entries = max_entries
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        while self._data and (len(self._data) > self.max_entries or
+                              (self.max_bytes is not None and self._bytes > self.max_bytes)):
+            _, (_, size) = self._data.popitem(last=False)
+            self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+# 进程内共享的用户数据缓存（mid -> 解析后的dict）和卡片缓存（mid -> PNG字节）
+record_cache = LRUCache(RECORD_CACHE_MAX_ENTRIES, RECORD_CACHE_MAX_BYTES)
+card_cache = LRUCache(CARD_CACHE_MAX_ENTRIES, CARD_CACHE_MAX_BYTES)
+# 缩小尺寸的卡片缓存，key为 (mid, 完整卡片的哈希, 宽度, 格式)，卡片更新后旧的条目不会再被命中，按LRU淘汰
+variant_cache = LRUCache(VARIANT_CACHE_MAX_ENTRIES, VARIANT_CACHE_MAX_BYTES)
+
+def invalidate_user_cache(mid):
+    """
+    用户数据或卡片发生变化时清除对应的内存缓存
+    """
+    record_cache.invalidate(mid)
+    card_cache.invalidate(mid)
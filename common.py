@@ -1,48 +1,473 @@
 # common.py
 import os
 import json
+import time
 import threading
-from collections import deque
+import atexit
+import itertools
+from concurrent.futures import Future
+from cache import LRUCache, record_cache, card_cache, invalidate_user_cache, CARD_CACHE_MAX_ENTRIES
+from storage import get_storage, get_snapshot_store, get_image_store
+from drawing import render_card, save_card_bytes, card_path, card_paths, card_digest, read_card_digest
 
 # 查询历史记录文件
 HISTORY_FILE = "query_history.json"
 history_lock = threading.Lock()
 
+# 用户数据缓存上限：超过最大用户数或磁盘占用（data/、img/、output/合计）时淘汰
+HISTORY_MAX_ENTRIES = 1000
+HISTORY_MAX_BYTES = 512 * 1024 * 1024
+# 淘汰策略：'lru'删除最久未访问的用户，'lfu'删除访问次数最少的用户
+HISTORY_POLICY = 'lru'
+# 查询历史只在内存中修改，由后台线程按此间隔（秒）批量写回文件
+HISTORY_FLUSH_INTERVAL = 2.0
+# 是否把生成的卡片保存到 output/ 目录（关闭后卡片只保存在内存缓存中）
+CARD_SAVE_TO_DISK = True
+
+# 不保存卡片文件时，内存缓存中每张卡片的绘制输入摘要
+_card_digests = LRUCache(CARD_CACHE_MAX_ENTRIES)
+# 已确认与当前数据一致的卡片：mid -> 绘制时的数据版本号（保存新数据后移除，下次请求卡片时检查摘要，按需重新绘制）
+_current_cards = LRUCache(CARD_CACHE_MAX_ENTRIES)
+# 每个用户的数据版本号，保存或删除数据时更新；绘制期间版本号变化说明卡片可能基于旧数据，不能标记为最新
+_data_generations = {}
+# 每个用户的卡片版本号，保存新卡片时更新；读取卡片文件期间版本号变化说明读到的可能是旧卡片，不能写入缓存
+_card_versions = {}
+_generation_lock = threading.Lock()
+# 版本号在进程内全局递增、不会重复，用户数据被淘汰后移除其版本号（视为0），
+# 之前读取到版本号的绘制和缓存写入会认为数据已变化
+_version_counter = itertools.count(1)
+
+# 删除被淘汰用户数据时持有的锁（按MID分段），再次查询该用户时等待删除完成后再继续
+EVICTION_LOCK_STRIPES = 64
+_eviction_locks = [threading.Lock() for _ in range(EVICTION_LOCK_STRIPES)]
+
+_query_history = None
+_history_dirty = False
+_history_flush_lock = threading.Lock()
+
+class SingleFlight:
+    """
+    同一个key的并发调用只执行一次，其他调用者等待并共享同一个结果（或异常）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+class QueryHistory:
+    """
+    用户数据的缓存淘汰策略：记录每个用户的访问次数、最近访问时间和磁盘占用，
+    超过条目数或磁盘占用上限时按LRU（最久未访问）或LFU（访问次数最少）删除用户数据
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, policy=None):
+        self.max_entries = max_entries if max_entries is not None else HISTORY_MAX_ENTRIES
+        self.max_bytes = max_bytes if max_bytes is not None else HISTORY_MAX_BYTES
+        self.policy = policy or HISTORY_POLICY
+        # mid -> {'hits': 访问次数, 'last_access': 最近访问时间, 'bytes': 磁盘占用}
+        self.entries = {}
+
+    @classmethod
+    def from_json(cls, data):
+        history = cls()
+        if isinstance(data, list):
+            # 旧版本格式：按查询顺序排列的MID列表
+            now = time.time()
+            for index, mid in enumerate(data):
+                history.entries[mid] = {'hits': 1, 'last_access': now - len(data) + index, 'bytes': 0}
+        else:
+            for mid, entry in data.get('entries', {}).items():
+                history.entries[int(mid)] = {
+                    'hits': entry.get('hits', 1),
+                    'last_access': entry.get('last_access', 0),
+                    'bytes': entry.get('bytes', 0),
+                }
+        return history
+
+    def to_json(self):
+        return {'entries': {str(mid): dict(entry) for mid, entry in self.entries.items()}}
+
+    def total_bytes(self):
+        return sum(entry['bytes'] for entry in self.entries.values())
+
+    def touch(self, mid):
+        """
+        记录一次访问（查询或读取），返回该用户是否已在记录中
+        """
+        entry = self.entries.get(mid)
+        if entry is None:
+            self.entries[mid] = {'hits': 1, 'last_access': time.time(), 'bytes': 0}
+            return False
+        entry['hits'] += 1
+        entry['last_access'] = time.time()
+        return True
+
+    def set_size(self, mid, size):
+        """
+        更新用户在磁盘上的占用
+        """
+        if mid in self.entries:
+            self.entries[mid]['bytes'] = size
+
+    def _victim(self, exclude):
+        candidates = [mid for mid in self.entries if mid != exclude]
+        if not candidates:
+            return None
+        if self.policy == 'lfu':
+            key = lambda mid: (self.entries[mid]['hits'], self.entries[mid]['last_access'])
+        else:
+            key = lambda mid: self.entries[mid]['last_access']
+        return min(candidates, key=key)
+
+    def evict(self, exclude=None):
+        """
+        超过上限时从记录中移除用户，exclude为正在查询的用户（不会被淘汰），
+        返回被淘汰的MID列表，由调用者在释放锁之后删除其数据文件
+        """
+        evicted = []
+        while len(self.entries) > self.max_entries or self.total_bytes() > self.max_bytes:
+            victim = self._victim(exclude)
+            if victim is None:
+                break
+            print(f"缓存已满（{len(self.entries)} 个用户，{self.total_bytes()} 字节），"
+                  f"淘汰用户数据 (MID: {victim}, 策略: {self.policy})")
+            del self.entries[victim]
+            evicted.append(victim)
+        return evicted
+
+def get_user_disk_usage(mid):
+    """
+    统计用户数据、图片和卡片占用的字节数
+    """
+    paths = card_paths(mid)
+    for kind in ('face', 'pendant', 'nameplate'):
+        for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
+            paths.append(f"img/{mid}_{kind}{ext}")
+    
+    total = get_storage().size_of(mid) + get_image_store().user_bytes(mid)
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
 def load_query_history():
     """从文件加载查询历史记录"""
     try:
         if os.path.exists(HISTORY_FILE):
             with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                return deque(data, maxlen=3)
+                return QueryHistory.from_json(data)
         else:
-            return deque(maxlen=3)
+            return QueryHistory()
     except Exception as e:
         print(f"加载查询历史失败: {e}")
-        return deque(maxlen=3)
+        return QueryHistory()
+
+def atomic_write_json(path, data, **kwargs):
+    """
+    先写临时文件再替换，保证文件内容始终完整
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, **kwargs)
+    os.replace(temp_path, path)
 
 def save_query_history(history):
     """保存查询历史记录到文件"""
     try:
-        with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(list(history), f, ensure_ascii=False)
+        atomic_write_json(HISTORY_FILE, history.to_json())
+        return True
     except Exception as e:
         print(f"保存查询历史失败: {e}")
+        return False
 
-def delete_user_data(mid):
+def init_query_history():
     """
-    删除指定用户的所有数据
+    启动时从文件加载一次查询历史，之后以内存中的记录为准，并启动后台写回线程
+    """
+    global _query_history
+    if _query_history is None:
+        with history_lock:
+            if _query_history is None:
+                _query_history = load_query_history()
+                flusher = threading.Thread(target=_history_flush_loop, name='history-flusher', daemon=True)
+                flusher.start()
+    return _query_history
+
+def _mark_history_dirty():
+    global _history_dirty
+    _history_dirty = True
+
+def flush_query_history():
     """
-    # 删除JSON数据文件
-    data_file = f"data/{mid}_data.json"
-    if os.path.exists(data_file):
+    把内存中的查询历史写回文件（只有发生变化时才写）
+    """
+    global _history_dirty
+    with _history_flush_lock:
+        with history_lock:
+            if _query_history is None or not _history_dirty:
+                return
+            snapshot = QueryHistory.from_json(_query_history.to_json())
+            _history_dirty = False
+        
+        # 写文件不持有history_lock，不阻塞查询
+        if not save_query_history(snapshot):
+            with history_lock:
+                _history_dirty = True
+
+def _history_flush_loop():
+    while True:
+        time.sleep(HISTORY_FLUSH_INTERVAL)
+        flush_query_history()
+
+# 程序退出时写回尚未保存的修改
+atexit.register(flush_query_history)
+
+def save_combined_data(mid, user_info, relation_stat, upstat_data, fetched_at=None):
+    """
+    保存合并后的数据到存储后端，fetched_at记录数据的查询时间（Unix时间戳）
+    """
+    # 合并所有数据
+    combined_data = {}
+    
+    # 添加用户基本信息
+    if user_info:
+        combined_data.update(user_info)
+    
+    # 添加关系数据
+    if relation_stat:
+        combined_data.update(relation_stat)
+    
+    # 添加统计数据
+    if upstat_data:
+        combined_data.update(upstat_data)
+    
+    # 记录查询时间，用于判断数据是否过期
+    combined_data['fetched_at'] = fetched_at if fetched_at is not None else time.time()
+    
+    try:
+        storage = get_storage()
+        storage.save(mid, combined_data)
+        # 卡片是否需要更新由render_user_card根据绘制输入的摘要判断
+        _bump_data_generation(mid)
+        print(f"数据已保存到: {storage.describe(mid)}")
+    except Exception as e:
+        print(f"保存数据时出错: {e}")
+        return False
+    
+    # 记录计数快照，用于统计增长趋势（失败不影响本次查询）
+    try:
+        get_snapshot_store().append(mid, combined_data)
+    except Exception as e:
+        print(f"记录数据快照失败: {e}")
+    return True
+
+def _data_generation(mid):
+    with _generation_lock:
+        return _data_generations.get(mid, 0)
+
+def _bump_data_generation(mid):
+    """
+    用户数据发生变化（保存或删除）后调用，清除内存中的用户数据，
+    并使正在进行的读取和绘制不会把旧数据写入缓存或把卡片标记为最新
+    """
+    with _generation_lock:
+        _data_generations[mid] = next(_version_counter)
+        record_cache.invalidate(mid)
+        _current_cards.invalidate(mid)
+
+def _forget_versions(mid):
+    """
+    用户数据删除后移除其版本号，避免版本号记录随查询过的用户数无限增长
+    """
+    with _generation_lock:
+        _data_generations.pop(mid, None)
+        _card_versions.pop(mid, None)
+        _current_cards.invalidate(mid)
+
+def load_user_record(mid):
+    """
+    加载用户数据，优先使用内存缓存，未命中时从存储后端读取并写入缓存
+    读取期间数据被保存或删除时不写入缓存，避免旧数据覆盖已清除的缓存
+    """
+    data = record_cache.get(mid)
+    if data is not None:
+        return data
+    
+    generation = _data_generation(mid)
+    try:
+        # 缓存占用按存储中的字节数计算，不需要重新序列化
+        data, size = get_storage().load_with_size(mid)
+    except Exception as e:
+        print(f"加载用户数据失败: {e}")
+        return None
+    
+    if data is not None:
+        with _generation_lock:
+            if _data_generations.get(mid, 0) == generation:
+                record_cache.put(mid, data, size)
+    return data
+
+def _mark_card_current(mid, generation):
+    """
+    绘制开始前读取的数据版本号没有变化时，把卡片标记为与当前数据一致
+    """
+    with _generation_lock:
+        if _data_generations.get(mid, 0) == generation:
+            _current_cards.put(mid, generation)
+
+def _is_card_current(mid):
+    with _generation_lock:
+        return _current_cards.get(mid) == _data_generations.get(mid, 0)
+
+def _prepare_card(mid, force=False):
+    """
+    加载用户数据并计算卡片绘制输入的摘要，返回 (用户数据, 摘要)；
+    已有卡片的摘要相同（不需要重新绘制）时用户数据为None，数据不存在时返回 (None, None)
+    """
+    user_data = get_storage().load(mid)
+    if user_data is None:
+        print(f"用户数据不存在: {mid}")
+        return None, None
+    
+    digest = card_digest(mid, user_data)
+    if not force:
+        if CARD_SAVE_TO_DISK:
+            current = read_card_digest(mid)
+        else:
+            current = _card_digests.get(mid) if mid in card_cache else None
+        if current == digest:
+            print(f"用户 {mid} 的卡片内容没有变化，跳过绘制")
+            return None, digest
+    return user_data, digest
+
+def _store_card(mid, card_bytes, digest):
+    """
+    保存渲染好的卡片并更新内存中的卡片缓存
+    """
+    with _generation_lock:
+        _card_versions[mid] = next(_version_counter)
+        card_cache.invalidate(mid)
+    _card_digests.invalidate(mid)
+    if card_bytes is None:
+        return False
+    if CARD_SAVE_TO_DISK:
         try:
-            os.remove(data_file)
-            print(f"已删除用户数据文件: {data_file}")
+            output_path = save_card_bytes(mid, card_bytes, digest=digest)
         except Exception as e:
-            print(f"删除数据文件失败: {e}")
+            print(f"保存用户卡片失败: {e}")
+            return False
+        print(f"用户信息卡片已生成: {output_path}")
+    else:
+        print(f"用户信息卡片已生成: {mid}（{len(card_bytes)} 字节，仅保存在内存中）")
+        _card_digests.put(mid, digest)
+    card_cache.put(mid, card_bytes, len(card_bytes))
+    return True
+
+def load_user_card(mid):
+    """
+    加载用户卡片图片字节，优先使用内存缓存，未命中时从文件读取并写入缓存（卡片只保存在内存中时不读取文件）
+    读取期间保存了新卡片时不写入缓存，避免旧卡片覆盖新卡片
+    """
+    card_bytes = card_cache.get(mid)
+    if card_bytes is not None or not CARD_SAVE_TO_DISK:
+        return card_bytes
+    
+    with _generation_lock:
+        version = _card_versions.get(mid, 0)
+    try:
+        with open(card_path(mid), 'rb') as f:
+            card_bytes = f.read()
+    except FileNotFoundError:
+        return None
+    
+    with _generation_lock:
+        if _card_versions.get(mid, 0) == version and mid not in card_cache:
+            card_cache.put(mid, card_bytes, len(card_bytes))
+    return card_bytes
+
+def render_user_card(mid, force=False):
+    """
+    在渲染进程池中绘制用户信息卡片，保存到 output/ 并更新内存中的卡片缓存
+    卡片上显示的内容没有变化时跳过绘制（force为True时总是重新绘制）
+    """
+    # 版本号必须在加载数据之前读取，绘制期间保存的新数据会使版本号变化
+    generation = _data_generation(mid)
+    user_data, digest = _prepare_card(mid, force)
+    if user_data is None:
+        result = digest is not None
+    else:
+        result = _store_card(mid, render_card(mid, user_data), digest)
+        if result and CARD_SAVE_TO_DISK:
+            # 卡片在查询数据之后才按需生成，保存后重新统计用户的磁盘占用（包括 output/ 中的卡片）
+            update_history_size(mid)
+    if result:
+        _mark_card_current(mid, generation)
+    return result
+
+def ensure_user_card(mid):
+    """
+    按需生成卡片：卡片已确认与当前数据一致时直接返回，
+    否则检查绘制输入的摘要，内容有变化或卡片不存在时重新绘制
+    """
+    if _is_card_current(mid) and (mid in card_cache or
+                                  (CARD_SAVE_TO_DISK and os.path.exists(card_path(mid)))):
+        return True
+    return render_user_card(mid)
+
+def delete_user_data(mid):
+    """
+    删除指定用户的所有数据
+    """
+    invalidate_user_cache(mid)
+    _card_digests.invalidate(mid)
+    _bump_data_generation(mid)
+    
+    # 删除用户数据
+    try:
+        storage = get_storage()
+        if storage.delete(mid):
+            print(f"已删除用户数据: {storage.describe(mid)}")
+    except Exception as e:
+        print(f"删除用户数据失败: {e}")
+    
+    # 释放图片引用，只有不再被其他用户引用的图片才会被删除
+    try:
+        removed = get_image_store().release(mid)
+        if removed:
+            print(f"已删除 {removed} 个不再使用的图片")
+    except Exception as e:
+        print(f"释放用户图片失败: {e}")
     
-    # 删除图片文件
+    # 删除旧版本按用户保存的图片文件
     img_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
     for ext in img_extensions:
         img_file = f"img/{mid}_face{ext}"
@@ -69,41 +494,76 @@ def delete_user_data(mid):
             except Exception as e:
                 print(f"删除勋章文件失败: {e}")
     
-    # 删除生成的用户卡片
-    card_file = f"output/{mid}.png"
-    if os.path.exists(card_file):
-        try:
-            os.remove(card_file)
-            print(f"已删除用户卡片: {card_file}")
-        except Exception as e:
-            print(f"删除用户卡片失败: {e}")
+    # 删除生成的用户卡片（包括切换格式前生成的旧格式卡片）
+    for card_file in card_paths(mid):
+        if os.path.exists(card_file):
+            try:
+                os.remove(card_file)
+                print(f"已删除用户卡片: {card_file}")
+            except Exception as e:
+                print(f"删除用户卡片失败: {e}")
+    
+    _forget_versions(mid)
+
+def _eviction_lock(mid):
+    return _eviction_locks[hash(mid) % EVICTION_LOCK_STRIPES]
+
+def _delete_evicted(query_history, evicted):
+    """
+    删除被淘汰用户的数据：删除前在history_lock中确认用户仍未被再次查询，
+    删除期间持有该用户的淘汰锁，再次查询的请求会等待删除完成，新数据不会被删除
+    """
+    for victim in evicted:
+        with _eviction_lock(victim):
+            with history_lock:
+                if victim in query_history.entries:
+                    print(f"用户 {victim} 在淘汰后被再次查询，保留数据")
+                    continue
+            delete_user_data(victim)
 
-def manage_query_history(mid):
+def manage_query_history(mid, record_access=True):
     """
-    管理查询历史记录，如果超过3个用户则删除最早的
+    管理查询历史记录，记录本次查询，超过条目数或磁盘占用上限时按策略删除用户数据
+    record_access为False时（后台刷新、已经记录过读取命中的查询）不增加访问次数，
+    只在用户不在记录中时加入记录，使保存的数据可以被淘汰
     """
+    query_history = init_query_history()
+    
     with history_lock:
-        # 从文件加载历史记录
-        query_history = load_query_history()
-        
-        print(f"当前查询历史: {list(query_history)}")
-        print(f"新查询用户: {mid}")
-        
-        # 检查是否是第四个查询，如果是则删除第一个查询的用户数据
-        if len(query_history) >= 3:
-            # 删除最早的用户数据
-            oldest_mid = query_history[0]
-            print(f"查询历史已满，正在删除最早的用户数据 (MID: {oldest_mid})...")
-            delete_user_data(oldest_mid)
-            query_history.popleft()
-        
-        # 如果用户已经在历史记录中，先移除再添加到末尾（更新顺序）
-        if mid in query_history:
-            query_history.remove(mid)
-        
-        # 添加到查询历史记录
-        query_history.append(mid)
-        print(f"更新后查询历史: {list(query_history)}")
-        
-        # 保存到文件
-        save_query_history(query_history)
\ No newline at end of file
+        print(f"新查询用户: {mid}（当前缓存 {len(query_history.entries)} 个用户）")
+        if record_access or mid not in query_history.entries:
+            query_history.touch(mid)
+        evicted = query_history.evict(exclude=mid)
+        _mark_history_dirty()
+    
+    # 该用户刚被淘汰、数据正在删除时，等待删除完成后再查询和保存新数据
+    with _eviction_lock(mid):
+        pass
+    
+    # 删除文件在锁外进行
+    _delete_evicted(query_history, evicted)
+
+def record_history_hit(mid):
+    """
+    记录一次读取命中（Web API直接返回已保存的数据时调用），供LRU/LFU策略参考
+    """
+    query_history = init_query_history()
+    
+    with history_lock:
+        if mid in query_history.entries:
+            query_history.touch(mid)
+            _mark_history_dirty()
+
+def update_history_size(mid):
+    """
+    查询完成后更新用户的磁盘占用，超过磁盘占用上限时按策略删除其他用户数据
+    """
+    query_history = init_query_history()
+    size = get_user_disk_usage(mid)
+    
+    with history_lock:
+        query_history.set_size(mid, size)
+        evicted = query_history.evict(exclude=mid)
+        _mark_history_dirty()
+    
+    _delete_evicted(query_history, evicted)
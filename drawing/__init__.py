@@ -1,9 +1,28 @@
-from .main import draw_user_card
-from .font_manager import get_font_path, load_fonts, safe_text_draw
+from .main import (draw_user_card, render_card_bytes, resize_card_bytes, encode_card, save_card_bytes, configure_card_format,
+                   card_path, card_paths, card_mimetype, card_digest, read_card_digest, CARD_WIDTH)
+from .font_manager import get_font_path, get_font, load_fonts, safe_text_draw
+from .render_service import render_card, submit_render, resize_card, configure_render_service, shutdown_render_service
 
 __all__ = [
     'draw_user_card',
+    'render_card_bytes',
+    'resize_card_bytes',
+    'encode_card',
+    'save_card_bytes',
+    'configure_card_format',
+    'card_path',
+    'card_paths',
+    'card_mimetype',
+    'card_digest',
+    'read_card_digest',
+    'CARD_WIDTH',
+    'render_card',
+    'submit_render',
+    'resize_card',
+    'configure_render_service',
+    'shutdown_render_service',
     'get_font_path', 
+    'get_font',
     'load_fonts',
     'safe_text_draw'
 ]
\ No newline at end of file
@@ -0,0 +1,122 @@
+import os
+import threading
+from PIL import Image, ImageDraw
+from cache import LRUCache
+from storage import get_image_store
+
+# 缩放后的图片缓存：最多缓存的图片数和总字节数（按RGBA像素估算）
+SPRITE_CACHE_MAX_ENTRIES = 1024
+SPRITE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# 进程内共享的缩放图片缓存，key为 (图片内容标识, 尺寸, 形状)，
+# 多个用户使用同一个头像框或勋章时只需要解码和缩放一次
+sprite_cache = LRUCache(SPRITE_CACHE_MAX_ENTRIES, SPRITE_CACHE_MAX_BYTES)
+
+# 卡片使用的图片类型
+IMAGE_KINDS = ('face', 'pendant', 'nameplate')
+
+# 圆形遮罩按尺寸缓存
+_circle_masks = {}
+_mask_lock = threading.Lock()
+
+def get_circle_mask(size):
+    """
+    获取指定尺寸的圆形遮罩（只绘制一次）
+    """
+    mask = _circle_masks.get(size)
+    if mask is None:
+        with _mask_lock:
+            mask = _circle_masks.get(size)
+            if mask is None:
+                mask = Image.new('L', (size, size), 0)
+                ImageDraw.Draw(mask).ellipse([(0, 0), (size, size)], fill=255)
+                _circle_masks[size] = mask
+    return mask
+
+class UserAssets:
+    """
+    单次绘制使用的用户图片（头像face、头像框pendant、勋章nameplate）：
+    每种图片只查找和解码一次，缩放结果按内容哈希放入共享缓存
+    返回的图片会被多个绘制共享，调用者不能修改
+    """
+
+    def __init__(self, mid, store=None):
+        self.mid = mid
+        self.store = store or get_image_store()
+        self._refs = {}
+        self._decoded = {}
+
+    def _ref(self, kind):
+        """
+        返回 (内容标识, 文件路径)，没有图片时返回None
+        """
+        if kind not in self._refs:
+            ref = self.store.get_ref(self.mid, kind)
+            if ref is None:
+                # 旧版本按用户保存的图片没有内容哈希，用路径和修改时间标识
+                path = self.store.find_user_image(self.mid, kind)
+                ref = ((path, os.path.getmtime(path)), path) if path else None
+            self._refs[kind] = ref
+        return self._refs[kind]
+
+    def content_keys(self):
+        """
+        每种图片的内容标识（没有图片时为None），用于判断卡片是否需要重新绘制
+        """
+        keys = {}
+        for kind in IMAGE_KINDS:
+            ref = self._ref(kind)
+            keys[kind] = ref[0] if ref is not None else None
+        return keys
+
+    def _decode(self, kind):
+        """
+        解码原始图片并转换为RGBA，失败时返回None
+        """
+        if kind not in self._decoded:
+            image = None
+            ref = self._ref(kind)
+            if ref is not None:
+                try:
+                    with Image.open(ref[1]) as source:
+                        image = source.convert('RGBA')
+                except Exception as e:
+                    print(f"加载图片失败 {ref[1]}: {e}")
+            self._decoded[kind] = image
+        return self._decoded[kind]
+
+    def sprite(self, kind, size):
+        """
+        获取缩放到 size x size 的RGBA图片，没有图片时返回None
+        """
+        ref = self._ref(kind)
+        if ref is None:
+            return None
+        key = (ref[0], size, 'square')
+        sprite = sprite_cache.get(key)
+        if sprite is None:
+            image = self._decode(kind)
+            if image is None:
+                return None
+            # CDN缩略图已经是布局需要的尺寸时不再缩放
+            sprite = image if image.size == (size, size) else image.resize((size, size), Image.LANCZOS)
+            sprite_cache.put(key, sprite, size * size * 4)
+        return sprite
+
+    def circle_sprite(self, kind, size):
+        """
+        获取缩放到 size x size 并裁剪成圆形的RGBA图片，没有图片时返回None
+        """
+        ref = self._ref(kind)
+        if ref is None:
+            return None
+        key = (ref[0], size, 'circle')
+        sprite = sprite_cache.get(key)
+        if sprite is None:
+            square = self.sprite(kind, size)
+            if square is None:
+                return None
+            sprite = Image.new('RGBA', (size, size), (0, 0, 0, 0))
+            sprite.paste(square, (0, 0), get_circle_mask(size))
+            sprite_cache.put(key, sprite, size * size * 4)
+        return sprite
@@ -1,11 +1,16 @@
+import threading
 from PIL import Image, ImageDraw
 
+# 卡片模板缓存：每种 (宽度, 高度, 字体) 的静态图层（背景、顶部、标题、底部）只绘制一次
+_templates = {}
+_template_lock = threading.Lock()
+
 def create_canvas(width=800, height=1000):
     """
-    创建画布
+    创建画布（RGBA，图片可以直接在画布上原地合成，保存时再转换为RGB）
     """
     # 创建白色背景
-    img = Image.new('RGB', (width, height), color=(255, 255, 255))
+    img = Image.new('RGBA', (width, height), color=(255, 255, 255, 255))
     draw = ImageDraw.Draw(img)
     return img, draw
 
@@ -40,4 +45,36 @@ def draw_footer(draw, width, height, fonts):
     """
     from .font_manager import safe_text_draw
     safe_text_draw(draw, (width//2, height-30), "来源 by 兆孽的B站用户查询", 
-                  fill=(150, 150, 150), font=fonts['small'], anchor="mm")
\ No newline at end of file
+                  fill=(150, 150, 150), font=fonts['small'], anchor="mm")
+
+def render_card_template(width, height, fonts):
+    """
+    绘制所有用户相同的静态图层：白色画布、顶部背景、标题和底部信息
+    """
+    img, draw = create_canvas(width, height)
+    draw_header_background(draw, width)
+    draw_header_title(draw, width, fonts)
+    draw_footer(draw, width, height, fonts)
+    return img
+
+def create_card_canvas(width, height, fonts):
+    """
+    获取已经绘制好静态图层的画布副本，每次绘制卡片只需要在副本上绘制用户相关的内容
+    """
+    key = (width, height, fonts.get('path'))
+    template = _templates.get(key)
+    if template is None:
+        with _template_lock:
+            template = _templates.get(key)
+            if template is None:
+                template = render_card_template(width, height, fonts)
+                _templates[key] = template
+    img = template.copy()
+    return img, ImageDraw.Draw(img)
+
+def clear_card_templates():
+    """
+    清空模板缓存（修改卡片样式或字体后调用）
+    """
+    with _template_lock:
+        _templates.clear()
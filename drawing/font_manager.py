@@ -1,9 +1,37 @@
 import os
 import platform
+import threading
+
+# 各用途的字体大小
+FONT_SIZES = {
+    'title': 28,   # 标题字体
+    'name': 24,    # 名字字体
+    'normal': 18,  # 正文字体
+    'stat': 16,    # 统计数据字体
+    'small': 16    # 小字体
+}
+
+# 进程内共享的字体注册表：字体路径只查找一次，字体对象按 (路径, 大小) 只加载一次
+_font_path_resolved = False
+_font_path = None
+_fonts = {}
+_font_lock = threading.Lock()
 
 def get_font_path():
     """
-    获取可用的字体路径，优先使用系统中文字体
+    获取可用的字体路径（进程内只查找一次）
+    """
+    global _font_path_resolved, _font_path
+    if not _font_path_resolved:
+        with _font_lock:
+            if not _font_path_resolved:
+                _font_path = find_font_path()
+                _font_path_resolved = True
+    return _font_path
+
+def find_font_path():
+    """
+    查找可用的字体路径，优先使用系统中文字体
     兼容Windows和Linux系统
     """
     # 首先检查项目目录中的字体
@@ -76,52 +104,37 @@ def get_font_path():
     print("警告: 未找到中文字体，将使用默认字体（可能不支持中文）")
     return None
 
-def load_fonts(font_path):
+def get_font(font_path, size):
     """
-    加载各种大小的字体
+    获取指定路径和大小的字体，同一 (路径, 大小) 在进程内只加载一次
+    font_path为空或加载失败时返回默认字体
     """
+    key = (font_path, size)
+    font = _fonts.get(key)
+    if font is not None:
+        return font
+    
     from PIL import ImageFont
     
-    try:
-        if font_path:
-            title_font = ImageFont.truetype(font_path, 28)  # 标题字体
-            name_font = ImageFont.truetype(font_path, 24)   # 名字字体
-            normal_font = ImageFont.truetype(font_path, 18) # 正文字体
-            stat_font = ImageFont.truetype(font_path, 16)   # 统计数据字体
-            small_font = ImageFont.truetype(font_path, 16)  # 小字体
-        else:
-            # 如果找不到字体，使用默认字体
-            title_font = ImageFont.load_default()
-            name_font = ImageFont.load_default()
-            normal_font = ImageFont.load_default()
-            stat_font = ImageFont.load_default()
-            small_font = ImageFont.load_default()
-            print("使用默认字体，中文可能显示为方块")
-        
-        return {
-            'title': title_font,
-            'name': name_font,
-            'normal': normal_font,
-            'stat': stat_font,
-            'small': small_font
-        }
-    except Exception as e:
-        print(f"加载字体失败: {e}")
-        # 使用默认字体
-        title_font = ImageFont.load_default()
-        name_font = ImageFont.load_default()
-        normal_font = ImageFont.load_default()
-        stat_font = ImageFont.load_default()
-        small_font = ImageFont.load_default()
-        print("使用默认字体，中文可能显示为方块")
-        
-        return {
-            'title': title_font,
-            'name': name_font,
-            'normal': normal_font,
-            'stat': stat_font,
-            'small': small_font
-        }
+    with _font_lock:
+        font = _fonts.get(key)
+        if font is None:
+            if font_path:
+                try:
+                    font = ImageFont.truetype(font_path, size)
+                except Exception as e:
+                    print(f"加载字体失败: {e}")
+            if font is None:
+                font = ImageFont.load_default()
+                print("使用默认字体，中文可能显示为方块")
+            _fonts[key] = font
+    return font
+
+def load_fonts(font_path):
+    """
+    加载各种大小的字体（使用共享的字体注册表，不会重复打开字体文件）
+    """
+    return {name: get_font(font_path, size) for name, size in FONT_SIZES.items()}
 
 def safe_text_draw(draw, position, text, font, fill, anchor=None):
     """
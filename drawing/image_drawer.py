@@ -1,95 +1,52 @@
-import os
-from PIL import Image
+from .asset_loader import UserAssets
 
-def load_user_images(mid):
+def load_user_images(mid, assets=None):
     """
-    加载用户的所有图片（头像、头像框、勋章）
+    加载用户的所有图片（头像、头像框、勋章），缩放为100x100
+    assets为本次绘制共享的UserAssets，为空时单独加载
     """
+    assets = assets or UserAssets(mid)
     images = {}
     
-    # 加载头像
-    for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
-        if os.path.exists(f"img/{mid}_face{ext}"):
-            try:
-                avatar = Image.open(f"img/{mid}_face{ext}")
-                if avatar.mode != 'RGBA':
-                    avatar = avatar.convert('RGBA')
-                avatar = avatar.resize((100, 100), Image.LANCZOS)
-                images['avatar'] = avatar
-                break
-            except Exception as e:
-                print(f"加载头像失败: {e}")
-    
-    # 加载头像框
-    for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
-        if os.path.exists(f"img/{mid}_pendant{ext}"):
-            try:
-                pendant = Image.open(f"img/{mid}_pendant{ext}")
-                if pendant.mode != 'RGBA':
-                    pendant = pendant.convert('RGBA')
-                pendant = pendant.resize((100, 100), Image.LANCZOS)
-                images['pendant'] = pendant
-                break
-            except Exception as e:
-                print(f"加载头像框失败: {e}")
-    
-    # 加载勋章
-    for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
-        if os.path.exists(f"img/{mid}_nameplate{ext}"):
-            try:
-                nameplate = Image.open(f"img/{mid}_nameplate{ext}")
-                if nameplate.mode != 'RGBA':
-                    nameplate = nameplate.convert('RGBA')
-                nameplate = nameplate.resize((100, 100), Image.LANCZOS)
-                images['nameplate'] = nameplate
-                break
-            except Exception as e:
-                print(f"加载勋章失败: {e}")
+    for kind, name, label in (('face', 'avatar', '头像'), ('pendant', 'pendant', '头像框'),
+                              ('nameplate', 'nameplate', '勋章')):
+        try:
+            sprite = assets.sprite(kind, 100)
+            if sprite is not None:
+                images[name] = sprite
+        except Exception as e:
+            print(f"加载{label}失败: {e}")
     
     return images
 
-def draw_user_pendant(img, mid, avatar_x=50, avatar_y=150, avatar_size=80):
+def draw_user_pendant(img, mid, avatar_x=50, avatar_y=150, avatar_size=80, assets=None):
     """
     绘制用户头像框
+    assets为本次绘制共享的UserAssets，为空时单独加载
     """
-    pendant_path = None
-    for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
-        if os.path.exists(f"img/{mid}_pendant{ext}"):
-            pendant_path = f"img/{mid}_pendant{ext}"
-            break
-    
-    if pendant_path:
-        try:
-            pendant = Image.open(pendant_path)
-            # 确保头像框是RGBA模式以保留透明度
-            if pendant.mode != 'RGBA':
-                pendant = pendant.convert('RGBA')
-                
-            # 调整头像框大小，使其比头像稍大
-            pendant_size = avatar_size + 40  # 增加更多空间
-            pendant = pendant.resize((pendant_size, pendant_size), Image.LANCZOS)
-            
+    assets = assets or UserAssets(mid)
+    try:
+        # 调整头像框大小，使其比头像稍大
+        pendant_size = avatar_size + 40  # 增加更多空间
+        pendant = assets.sprite('pendant', pendant_size)
+        if pendant is not None:
             # 计算头像框位置，使其居中于头像
             pendant_x = avatar_x - (pendant_size - avatar_size) // 2
             pendant_y = avatar_y - (pendant_size - avatar_size) // 2
             
-            # 创建临时图像用于合成
-            temp_img = Image.new('RGBA', img.size, (0, 0, 0, 0))
-            temp_img.paste(pendant, (pendant_x, pendant_y), pendant)
-            
-            # 将头像框合成到主图像
-            img = Image.alpha_composite(img.convert('RGBA'), temp_img).convert('RGB')
+            # 在RGBA画布上原地合成头像框（只处理头像框所在的区域）
+            img.alpha_composite(pendant, (pendant_x, pendant_y))
             
             return img, True
             
-        except Exception as e:
-            print(f"加载头像框失败: {e}")
+    except Exception as e:
+        print(f"加载头像框失败: {e}")
     
     return img, False
 
 def draw_user_images_grid(img, images, start_y, width=800):
     """
-    在网格中绘制用户图片
+    在网格中绘制用户图片（img为RGBA画布，图片原地合成）
     """
     from PIL import ImageDraw
     
@@ -117,15 +74,8 @@ def draw_user_images_grid(img, images, start_y, width=800):
         for j, (img_type, img_data) in enumerate(row_images):
             x_pos = start_x + j * 120  # 每张图片加上间距
         
-            # 创建临时图像用于合成
-            temp_img = Image.new('RGBA', img.size, (0, 0, 0, 0))
-            temp_img.paste(img_data, (x_pos, row_y), img_data)
-            
-            # 将图片合成到主图像
-            img = Image.alpha_composite(img.convert('RGBA'), temp_img).convert('RGB')
-            
-            # 重新创建draw对象
-            draw = ImageDraw.Draw(img)
+            # 将图片原地合成到主图像
+            img.alpha_composite(img_data, (x_pos, row_y))
     
     # 计算需要的高度
     rows_needed = (len(images_to_show) + images_per_row - 1) // images_per_row  # 向上取整
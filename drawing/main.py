@@ -1,54 +1,173 @@
-import json
+import io
 import os
-from PIL import ImageDraw
+import json
+import hashlib
+import threading
+from PIL import Image
+from storage import get_storage
 from .font_manager import get_font_path, load_fonts
-from .background_drawer import create_canvas, draw_header_background, draw_header_title, draw_statistics_background, draw_footer
+from .background_drawer import create_card_canvas, draw_statistics_background
 from .user_info_drawer import draw_user_avatar, draw_user_basic_info, draw_user_details
 from .image_drawer import load_user_images, draw_user_pendant, draw_user_images_grid
 from .stats_drawer import draw_statistics_title, draw_statistics_cards
+from .asset_loader import UserAssets
+
+# 卡片尺寸和输出目录
+CARD_WIDTH = 800
+CARD_HEIGHT = 1000
+CARD_OUTPUT_DIR = "output"
+
+# 卡片样式版本：修改绘制代码后增加，已生成的卡片会在下次查询时重新绘制
+CARD_TEMPLATE_VERSION = 2
+# 卡片上显示的用户数据字段（修改绘制内容时需要同步更新）
+RENDER_FIELDS = ('name', 'level', 'vip_text', 'sex', 'sign', 'official_title', 'attestation_title',
+                 'nameplate_name', 'follower', 'following', 'view', 'likes')
 
-def draw_user_card(mid):
+# 卡片编码格式：'png'、'webp' 或 'jpeg'
+CARD_FORMAT = 'png'
+# WebP/JPEG的质量（1-100）
+CARD_QUALITY = 85
+# PNG压缩级别（0-9，越大文件越小、编码越慢）
+PNG_COMPRESS_LEVEL = 6
+# WebP是否使用无损压缩
+WEBP_LOSSLESS = False
+# WebP编码速度（0-6，越大文件越小、编码越慢）
+WEBP_METHOD = 4
+
+# 格式 -> (PIL格式名, MIME类型, 文件扩展名)
+CARD_FORMATS = {
+    'png': ('PNG', 'image/png', '.png'),
+    'webp': ('WEBP', 'image/webp', '.webp'),
+    'jpeg': ('JPEG', 'image/jpeg', '.jpg'),
+}
+
+def configure_card_format(fmt=None, quality=None, png_compress_level=None, webp_lossless=None):
     """
-    主绘制函数 - 绘制用户信息卡片
+    修改卡片的默认编码格式和质量
+    """
+    global CARD_FORMAT, CARD_QUALITY, PNG_COMPRESS_LEVEL, WEBP_LOSSLESS
+    if fmt is not None:
+        if fmt not in CARD_FORMATS:
+            raise ValueError(f"不支持的卡片格式: {fmt}")
+        CARD_FORMAT = fmt
+    if quality is not None:
+        CARD_QUALITY = quality
+    if png_compress_level is not None:
+        PNG_COMPRESS_LEVEL = png_compress_level
+    if webp_lossless is not None:
+        WEBP_LOSSLESS = webp_lossless
+
+def get_encode_options(fmt=None, quality=None):
+    """
+    返回完整的编码参数（未指定的使用默认配置），渲染进程使用父进程传入的参数
+    """
+    fmt = fmt or CARD_FORMAT
+    if fmt not in CARD_FORMATS:
+        raise ValueError(f"不支持的卡片格式: {fmt}")
+    return {
+        'fmt': fmt,
+        'quality': quality if quality is not None else CARD_QUALITY,
+        'png_compress_level': PNG_COMPRESS_LEVEL,
+        'webp_lossless': WEBP_LOSSLESS,
+    }
+
+def card_mimetype(fmt=None):
+    return CARD_FORMATS[fmt or CARD_FORMAT][1]
+
+def card_path(mid, fmt=None):
+    """
+    卡片文件路径 output/{mid}.{扩展名}
+    """
+    return f"{CARD_OUTPUT_DIR}/{mid}{CARD_FORMATS[fmt or CARD_FORMAT][2]}"
+
+def digest_path(mid, fmt=None):
+    """
+    卡片绘制输入摘要的文件路径，与卡片保存在一起
+    """
+    return f"{card_path(mid, fmt)}.digest"
+
+def card_paths(mid):
+    """
+    用户所有格式的卡片文件及其摘要文件的路径（切换格式后可能残留旧格式的文件）
+    """
+    paths = []
+    for fmt in CARD_FORMATS:
+        paths.append(card_path(mid, fmt))
+        paths.append(digest_path(mid, fmt))
+    return paths
+
+def card_digest(mid, user_data, fmt=None, quality=None):
+    """
+    计算卡片绘制输入的摘要：卡片上显示的数据字段、图片内容哈希、字体、样式版本和编码参数，
+    摘要相同时绘制结果相同，不需要重新绘制
+    """
+    payload = {
+        'mid': mid,
+        'data': {field: user_data.get(field) for field in RENDER_FIELDS},
+        'assets': UserAssets(mid).content_keys(),
+        'font': get_font_path(),
+        'template': CARD_TEMPLATE_VERSION,
+        'size': [CARD_WIDTH, CARD_HEIGHT],
+        'encode': get_encode_options(fmt, quality),
+    }
+    content = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def read_card_digest(mid, fmt=None):
+    """
+    读取已保存卡片的绘制输入摘要，卡片或摘要不存在时返回None
+    """
+    if not os.path.exists(card_path(mid, fmt)):
+        return None
+    try:
+        with open(digest_path(mid, fmt), 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def load_card_fonts():
+    """
+    加载绘制卡片使用的字体
     """
-    # 检查数据文件是否存在
-    data_file = f"data/{mid}_data.json"
-    if not os.path.exists(data_file):
-        print(f"数据文件不存在: {data_file}")
-        return False
-    
-    # 加载数据
-    with open(data_file, 'r', encoding='utf-8') as f:
-        user_data = json.load(f)
-    
-    # 创建画布
-    width = 800
-    height = 1000
-    img, draw = create_canvas(width, height)
-    
-    # 加载字体
     font_path = get_font_path()
     fonts = load_fonts(font_path)
     fonts['path'] = font_path  # 保存字体路径供后续使用
+    return fonts
+
+def warm_up():
+    """
+    预先加载字体和卡片模板，避免第一次绘制时的等待（渲染进程启动时调用）
+    """
+    create_card_canvas(CARD_WIDTH, CARD_HEIGHT, load_card_fonts())
+
+def render_card_image(mid, user_data):
+    """
+    绘制用户信息卡片，返回RGBA画布
+    """
+    width = CARD_WIDTH
+    height = CARD_HEIGHT
     
-    # 1. 绘制顶部背景和标题
-    draw_header_background(draw, width)
-    draw_header_title(draw, width, fonts)
+    # 加载字体
+    fonts = load_card_fonts()
+    
+    # 本次绘制使用的用户图片，每张图片只解码一次
+    assets = UserAssets(mid)
+    
+    # 1. 创建画布（顶部背景、标题和底部信息来自缓存的模板）
+    img, draw = create_card_canvas(width, height, fonts)
     
     # 2. 绘制用户头像和基本信息
-    draw_user_avatar(img, draw, mid)
+    draw_user_avatar(img, draw, mid, assets=assets)
     basic_info_end_y = draw_user_basic_info(draw, user_data, mid, fonts=fonts)
     
     # 3. 绘制用户详细信息
     details_end_y = draw_user_details(draw, user_data, basic_info_end_y, fonts=fonts)
     
     # 4. 绘制头像框
-    img, has_pendant = draw_user_pendant(img, mid)
-    if has_pendant:
-        draw = ImageDraw.Draw(img)  # 重新创建draw对象
+    img, has_pendant = draw_user_pendant(img, mid, assets=assets)
     
     # 5. 加载和绘制用户图片网格
-    user_images = load_user_images(mid)
+    user_images = load_user_images(mid, assets)
     if user_images:
         img, draw, images_height = draw_user_images_grid(img, user_images, details_end_y, width)
         images_end_y = details_end_y + images_height + 30
@@ -60,15 +179,90 @@ def draw_user_card(mid):
     draw_statistics_title(draw, width, images_end_y + 30, fonts)
     draw_statistics_cards(draw, user_data, width, images_end_y + 30, fonts)
     
-    # 7. 绘制底部信息
-    draw_footer(draw, width, height, fonts)
+    return img
+
+def encode_card(img, fmt=None, quality=None, png_compress_level=None, webp_lossless=None):
+    """
+    在内存中编码卡片，返回图片字节（整个绘制过程使用同一个RGBA画布，只在编码时转换一次）
+    """
+    options = get_encode_options(fmt, quality)
+    if png_compress_level is not None:
+        options['png_compress_level'] = png_compress_level
+    if webp_lossless is not None:
+        options['webp_lossless'] = webp_lossless
     
+    buffer = io.BytesIO()
+    rgb = img.convert('RGB')
+    if options['fmt'] == 'png':
+        rgb.save(buffer, "PNG", compress_level=options['png_compress_level'])
+    elif options['fmt'] == 'webp':
+        rgb.save(buffer, "WEBP", quality=options['quality'], lossless=options['webp_lossless'],
+                 method=WEBP_METHOD)
+    else:
+        # 渐进式JPEG，浏览器可以边下载边显示
+        rgb.save(buffer, "JPEG", quality=options['quality'], progressive=True, optimize=True)
+    return buffer.getvalue()
+
+def render_card_bytes(mid, user_data=None, **encode_options):
+    """
+    绘制用户信息卡片并返回编码后的字节，user_data为空时从存储后端加载，数据不存在时返回None
+    encode_options为encode_card的编码参数（fmt、quality等）
+    """
+    if user_data is None:
+        user_data = get_storage().load(mid)
+        if user_data is None:
+            print(f"用户数据不存在: {mid}")
+            return None
+    return encode_card(render_card_image(mid, user_data), **encode_options)
+
+def resize_card_bytes(card_bytes, width, **encode_options):
+    """
+    把已经编码的完整尺寸卡片缩小到指定宽度（高度按比例），返回编码后的字节
+    """
+    with Image.open(io.BytesIO(card_bytes)) as master:
+        height = max(1, round(master.height * width / master.width))
+        # JPEG可以在解码时直接按比例缩小
+        master.draft('RGB', (width, height))
+        img = master.convert('RGB').resize((width, height), Image.LANCZOS)
+    return encode_card(img, **encode_options)
+
+def save_card_bytes(mid, card_bytes, fmt=None, digest=None):
+    """
+    保存卡片图片到 output/{mid}.{扩展名}，返回文件路径
+    digest为卡片绘制输入的摘要，保存在 output/{mid}.{扩展名}.digest
+    """
     # 确保输出目录存在
-    os.makedirs("output", exist_ok=True)
+    os.makedirs(CARD_OUTPUT_DIR, exist_ok=True)
+    
+    output_path = card_path(mid, fmt)
+    # 先写临时文件再替换，避免并发请求读取到未写完的图片
+    temp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(card_bytes)
+    os.replace(temp_path, output_path)
+    
+    # 摘要在卡片之后写入，进程中断时最多导致下次多绘制一次
+    digest_file = digest_path(mid, fmt)
+    if digest is None:
+        if os.path.exists(digest_file):
+            os.remove(digest_file)
+    else:
+        temp_path = f"{digest_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(digest)
+        os.replace(temp_path, digest_file)
+    return output_path
+
+def draw_user_card(mid, user_data=None, fmt=None, quality=None):
+    """
+    主绘制函数 - 在当前进程中绘制用户信息卡片并保存到 output/{mid}.{扩展名}
+    user_data为空时从存储后端加载
+    """
+    card_bytes = render_card_bytes(mid, user_data, fmt=fmt, quality=quality)
+    if card_bytes is None:
+        return False
     
-    # 保存图片
-    output_path = f"output/{mid}.png"
-    img.save(output_path, "PNG")
+    output_path = save_card_bytes(mid, card_bytes, fmt)
     print(f"用户信息卡片已生成: {output_path}")
     
     return True
\ No newline at end of file
@@ -0,0 +1,125 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from .main import render_card_bytes, resize_card_bytes, get_encode_options, warm_up
+
+# 渲染进程数（默认等于CPU核心数），设为0时在当前进程中绘制
+RENDER_WORKERS = os.cpu_count() or 1
+# 等待一次渲染的最长时间（秒）
+RENDER_TIMEOUT = 60
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _init_worker():
+    """
+    渲染进程启动时预先加载字体和卡片模板
+    """
+    try:
+        warm_up()
+    except Exception as e:
+        print(f"预加载字体和模板失败: {e}")
+
+def _render_job(mid, user_data, encode_options):
+    """
+    在渲染进程中绘制卡片，返回编码后的字节（失败时返回None）
+    """
+    try:
+        return render_card_bytes(mid, user_data, **encode_options)
+    except Exception as e:
+        print(f"绘制用户 {mid} 卡片失败: {e}")
+        return None
+
+def _resize_job(card_bytes, width, encode_options):
+    """
+    在渲染进程中缩放卡片，返回编码后的字节（失败时返回None）
+    """
+    try:
+        return resize_card_bytes(card_bytes, width, **encode_options)
+    except Exception as e:
+        print(f"缩放卡片失败: {e}")
+        return None
+
+def get_render_pool():
+    """
+    获取共享的渲染进程池（使用spawn启动，不继承父进程的线程和数据库连接）
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=RENDER_WORKERS,
+                                            mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_init_worker)
+    return _pool
+
+def configure_render_service(workers):
+    """
+    修改渲染进程数（0表示在当前进程中绘制），下次提交任务时生效
+    """
+    global RENDER_WORKERS
+    RENDER_WORKERS = workers
+    shutdown_render_service()
+
+def shutdown_render_service():
+    """
+    关闭渲染进程池
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+def _submit(job, *args):
+    """
+    把任务提交到渲染进程池，RENDER_WORKERS为0时在当前进程中执行
+    """
+    if RENDER_WORKERS <= 0:
+        future = Future()
+        future.set_result(job(*args))
+        return future
+    try:
+        return get_render_pool().submit(job, *args)
+    except BrokenProcessPool:
+        # 渲染进程异常退出后重新创建进程池
+        print("渲染进程池已损坏，重新创建")
+        shutdown_render_service()
+        return get_render_pool().submit(job, *args)
+
+def _wait(future, timeout, description):
+    """
+    等待渲染任务结果，失败时返回None
+    """
+    try:
+        return future.result(timeout=timeout)
+    except BrokenProcessPool:
+        print(f"{description}失败: 渲染进程异常退出")
+        shutdown_render_service()
+        return None
+    except Exception as e:
+        print(f"{description}失败: {e}")
+        return None
+
+def submit_render(mid, user_data=None, fmt=None, quality=None):
+    """
+    提交渲染任务，返回Future，结果为编码后的图片字节（数据不存在或绘制失败时为None）
+    fmt/quality为空时使用当前进程的默认配置
+    """
+    # 编码参数在当前进程中确定，渲染进程不会看到运行时修改的配置
+    return _submit(_render_job, mid, user_data, get_encode_options(fmt, quality))
+
+def render_card(mid, user_data=None, fmt=None, quality=None, timeout=RENDER_TIMEOUT):
+    """
+    在渲染进程中绘制用户卡片并等待结果，返回编码后的图片字节，失败时返回None
+    """
+    return _wait(submit_render(mid, user_data, fmt, quality), timeout, f"绘制用户 {mid} 卡片")
+
+def resize_card(card_bytes, width, fmt=None, quality=None, timeout=RENDER_TIMEOUT):
+    """
+    在渲染进程中把完整尺寸的卡片缩小到指定宽度，返回编码后的图片字节，失败时返回None
+    """
+    return _wait(_submit(_resize_job, card_bytes, width, get_encode_options(fmt, quality)),
+                 timeout, "缩放卡片")
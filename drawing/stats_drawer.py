@@ -1,4 +1,5 @@
 from .font_manager import safe_text_draw
+from .text_layout import fit_font, text_width
 
 def draw_statistics_title(draw, width, y_position, fonts):
     """
@@ -38,36 +39,20 @@ def draw_statistics_cards(draw, user_data, width, start_y, fonts):
         # 绘制数值（居中）- 使用更小的字体确保数字不超出边界
         value = stat["value"]
         
-        # 如果数字太长，自动缩小字体
-        current_font_size = 16
-        while current_font_size >= 10:
-            try:
-                if fonts.get('path'):
-                    from PIL import ImageFont
-                    current_font = ImageFont.truetype(fonts['path'], current_font_size)
-                else:
-                    current_font = fonts['stat']
-                    
-                value_bbox = draw.textbbox((0, 0), value, font=current_font)
-                value_width = value_bbox[2] - value_bbox[0]
-                
-                if value_width <= card_width - 20:  # 留出边距
-                    break
-                current_font_size -= 1
-            except:
-                current_font = fonts['stat']
-                break
+        # 如果数字太长，自动缩小字体（在16到10之间二分查找能放下的最大字号）
+        if fonts.get('path'):
+            current_font = fit_font(fonts['path'], value, card_width - 20, 16, 10)  # 留出边距
+        else:
+            current_font = fonts['stat']
         
         # 计算位置
-        value_bbox = draw.textbbox((0, 0), value, font=current_font)
-        value_width = value_bbox[2] - value_bbox[0]
+        value_width = text_width(current_font, value)
         value_x = x + (card_width - value_width) // 2
         
         safe_text_draw(draw, (value_x, y+10), value, fill=stat["color"], font=current_font)
         
         # 绘制标签
-        label_bbox = draw.textbbox((0, 0), stat["label"], font=fonts['normal'])
-        label_width = label_bbox[2] - label_bbox[0]
+        label_width = text_width(fonts['normal'], stat["label"])
         label_x = x + (card_width - label_width) // 2
         
         safe_text_draw(draw, (label_x, y+30), stat["label"], fill=(100, 100, 100), font=fonts['normal'])
\ No newline at end of file
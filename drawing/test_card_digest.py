@@ -0,0 +1,88 @@
+import pytest
+import common
+from drawing import main
+
+USER = {'name': '测试用户', 'level': 6, 'follower': 100, 'fetched_at': 1.0}
+
+
+class FakeAssets:
+    keys = {'face': 'hash-a', 'pendant': None, 'nameplate': None}
+
+    def __init__(self, mid):
+        self.mid = mid
+
+    def content_keys(self):
+        return dict(self.keys)
+
+
+@pytest.fixture(autouse=True)
+def render_env(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, 'UserAssets', FakeAssets)
+    monkeypatch.setattr(main, 'get_font_path', lambda: 'font.ttf')
+    monkeypatch.setattr(main, 'CARD_OUTPUT_DIR', str(tmp_path))
+    monkeypatch.setattr(FakeAssets, 'keys', dict(FakeAssets.keys))
+
+
+def test_digest_stable():
+    assert main.card_digest(2, USER) == main.card_digest(2, dict(USER))
+
+
+def test_digest_ignores_fields_not_drawn():
+    assert main.card_digest(2, USER) == main.card_digest(2, dict(USER, fetched_at=2.0))
+
+
+def test_digest_changes_with_drawn_field():
+    assert main.card_digest(2, USER) != main.card_digest(2, dict(USER, level=5))
+
+
+def test_digest_changes_with_template_version(monkeypatch):
+    before = main.card_digest(2, USER)
+    monkeypatch.setattr(main, 'CARD_TEMPLATE_VERSION', main.CARD_TEMPLATE_VERSION + 1)
+    assert main.card_digest(2, USER) != before
+
+
+def test_digest_changes_with_asset():
+    before = main.card_digest(2, USER)
+    FakeAssets.keys['face'] = 'hash-b'
+    assert main.card_digest(2, USER) != before
+
+
+class FakeStorage:
+    def load(self, mid):
+        return dict(USER)
+
+
+@pytest.fixture
+def saved_card(monkeypatch):
+    """
+    保存一张用当前输入绘制的卡片
+    """
+    monkeypatch.setattr(common, 'get_storage', FakeStorage)
+    monkeypatch.setattr(common, 'CARD_SAVE_TO_DISK', True)
+    digest = main.card_digest(2, USER)
+    main.save_card_bytes(2, b'card', digest=digest)
+    return digest
+
+
+def test_unchanged_card_skipped(saved_card):
+    assert common._prepare_card(2) == (None, saved_card)
+
+
+def test_forced_render_not_skipped(saved_card):
+    user_data, digest = common._prepare_card(2, force=True)
+    assert user_data == USER
+    assert digest == saved_card
+
+
+def test_template_version_invalidates_card(saved_card, monkeypatch):
+    monkeypatch.setattr(main, 'CARD_TEMPLATE_VERSION', main.CARD_TEMPLATE_VERSION + 1)
+    user_data, digest = common._prepare_card(2)
+    assert user_data == USER
+    assert digest != saved_card
+
+
+def test_asset_change_invalidates_card(saved_card):
+    FakeAssets.keys['pendant'] = 'hash-p'
+    user_data, digest = common._prepare_card(2)
+    assert user_data == USER
+    assert digest != saved_card
@@ -0,0 +1,74 @@
+import pytest
+from PIL import ImageFont
+from cache import LRUCache
+from drawing import text_layout
+
+
+class FakeFont:
+    """
+    每个字符宽度等于字号的字体，便于计算预期结果
+    """
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+
+    def getbbox(self, text):
+        return 0, 0, len(text) * self.size, self.size
+
+    def getlength(self, text):
+        return len(text) * self.size
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    monkeypatch.setattr(text_layout, 'measure_cache', LRUCache(1024))
+    monkeypatch.setattr(text_layout, 'layout_cache', LRUCache(1024))
+    monkeypatch.setattr(text_layout, 'get_font', FakeFont)
+
+
+def test_font_key_uses_path():
+    assert text_layout.font_key(FakeFont('a.ttf', 12)) == ('a.ttf', 12)
+
+
+def test_font_key_default_font_is_stable():
+    # 默认字体没有文件路径，不能用对象标识作为缓存key
+    first = ImageFont.load_default()
+    second = ImageFont.load_default()
+    assert text_layout.font_key(first) == text_layout.font_key(second)
+    assert text_layout.font_key(first)[0] == 'default'
+
+
+@pytest.mark.parametrize('max_width, expected', [
+    (100, 25),   # 4个字符 * 25 = 100
+    (99, 24),
+    (1000, 40),  # 不超过最大字号
+    (10, 10),    # 放不下时使用最小字号
+])
+def test_fit_font(max_width, expected):
+    font = text_layout.fit_font('a.ttf', 'abcd', max_width, max_size=40, min_size=10)
+    assert font.size == expected
+
+
+@pytest.mark.parametrize('text, max_width, expected', [
+    ('', 100, []),
+    ('   ', 100, []),
+    ('\n', 100, []),
+    ('hello world', 60, ['hello', 'world']),
+    ('hello world', 110, ['hello world']),
+    # 比一行更长的单词按字符断开
+    ('abcdefghij', 30, ['abc', 'def', 'ghi', 'j']),
+    ('ab abcdefgh', 40, ['ab', 'abcd', 'efgh']),
+    # 显式换行
+    ('ab\ncd', 100, ['ab', 'cd']),
+    ('ab\n\ncd', 100, ['ab', 'cd']),
+])
+def test_wrap(text, max_width, expected):
+    assert text_layout._wrap(FakeFont('a.ttf', 10), text, max_width) == expected
+
+
+def test_wrap_text_max_lines():
+    font = FakeFont('a.ttf', 10)
+    assert text_layout.wrap_text(font, 'abcdefghij', 30, max_lines=2) == ['abc', 'def']
+    # 缓存命中时返回相同结果
+    assert text_layout.wrap_text(font, 'abcdefghij', 30, max_lines=2) == ['abc', 'def']
@@ -0,0 +1,109 @@
+from cache import LRUCache
+from .font_manager import get_font
+
+# 文字测量缓存（(字体, 文字) -> 边界框 / 字符宽度）和排版结果缓存的最大条目数
+TEXT_MEASURE_CACHE_MAX_ENTRIES = 16384
+TEXT_LAYOUT_CACHE_MAX_ENTRIES = 4096
+
+# 进程内共享的测量和排版缓存，相同的文字（例如统计标签、常见头衔）只测量和排版一次
+measure_cache = LRUCache(TEXT_MEASURE_CACHE_MAX_ENTRIES)
+layout_cache = LRUCache(TEXT_LAYOUT_CACHE_MAX_ENTRIES)
+
+def font_key(font):
+    """
+    字体的缓存标识 (字体路径, 大小)；默认字体没有文件路径（新版Pillow中为内存中的字体数据），
+    使用固定的 'default' 标识，不使用对象标识（对象被回收后标识可能被新的字体复用）
+    """
+    path = getattr(font, 'path', None)
+    size = getattr(font, 'size', None)
+    if isinstance(path, str):
+        return path, size
+    return 'default', size
+
+def text_bbox(font, text):
+    """
+    文字在 (0, 0) 处绘制时的边界框 (left, top, right, bottom)
+    """
+    key = ('bbox', font_key(font), text)
+    bbox = measure_cache.get(key)
+    if bbox is None:
+        bbox = font.getbbox(text)
+        measure_cache.put(key, bbox)
+    return bbox
+
+def text_width(font, text):
+    """
+    文字的像素宽度
+    """
+    left, _, right, _ = text_bbox(font, text)
+    return right - left
+
+def char_width(font, char):
+    """
+    单个字符的前进宽度（用于按像素宽度换行）
+    """
+    key = ('char', font_key(font), char)
+    width = measure_cache.get(key)
+    if width is None:
+        width = font.getlength(char)
+        measure_cache.put(key, width)
+    return width
+
+def fit_font(font_path, text, max_width, max_size, min_size):
+    """
+    二分查找宽度不超过max_width的最大字号（不小于min_size），返回字体
+    """
+    key = ('fit', font_path, text, max_width, max_size, min_size)
+    size = layout_cache.get(key)
+    if size is None:
+        low, high = min_size, max_size
+        size = min_size
+        while low <= high:
+            middle = (low + high) // 2
+            if text_width(get_font(font_path, middle), text) <= max_width:
+                size = middle
+                low = middle + 1
+            else:
+                high = middle - 1
+        layout_cache.put(key, size)
+    return get_font(font_path, size)
+
+def wrap_text(font, text, max_width, max_lines=None):
+    """
+    按像素宽度换行，优先在空格处断开，返回行的列表（超过max_lines的部分不显示）
+    """
+    key = ('wrap', font_key(font), text, max_width, max_lines)
+    lines = layout_cache.get(key)
+    if lines is None:
+        lines = _wrap(font, text, max_width)
+        if max_lines is not None:
+            lines = lines[:max_lines]
+        lines = tuple(lines)
+        layout_cache.put(key, lines)
+    return list(lines)
+
+def _wrap(font, text, max_width):
+    lines = []
+    for paragraph in text.split('\n'):
+        line = ''
+        width = 0
+        for char in paragraph:
+            advance = char_width(font, char)
+            if line and width + advance > max_width:
+                # 当前行包含空格时在最后一个空格处断开，避免拆开英文单词
+                split_at = line.rfind(' ')
+                if char != ' ' and split_at > 0:
+                    lines.append(line[:split_at].rstrip())
+                    line = line[split_at + 1:]
+                else:
+                    lines.append(line.rstrip())
+                    line = ''
+                width = sum(char_width(font, c) for c in line)
+                if not line and char == ' ':
+                    # 行首的空格不显示
+                    continue
+            line += char
+            width += advance
+        if line.strip():
+            lines.append(line.rstrip())
+    return lines
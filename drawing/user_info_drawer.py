@@ -1,37 +1,26 @@
-import os
-import textwrap
-from PIL import Image, ImageDraw
 from .font_manager import safe_text_draw, get_font_path, load_fonts
+from .asset_loader import UserAssets
+from .text_layout import wrap_text
 
-def draw_user_avatar(img, draw, mid, x=50, y=150, size=80):
+# 用户名每行的最大宽度（像素，约15个汉字）
+NAME_MAX_WIDTH = 360
+# 签名、头衔、认证每行的最大宽度（像素）
+DETAIL_MAX_WIDTH = 700
+
+def draw_user_avatar(img, draw, mid, x=50, y=150, size=80, assets=None):
     """
     绘制用户头像
+    assets为本次绘制共享的UserAssets，为空时单独加载
     """
-    avatar_path = None
-    for ext in ['.jpg', '.jpeg', '.png', '.gif', '.webp']:
-        if os.path.exists(f"img/{mid}_face{ext}"):
-            avatar_path = f"img/{mid}_face{ext}"
-            break
-    
-    if avatar_path:
-        try:
-            avatar = Image.open(avatar_path)
-            avatar = avatar.resize((size, size), Image.LANCZOS)
-            
-            # 创建圆形遮罩
-            mask = Image.new('L', (size, size), 0)
-            mask_draw = ImageDraw.Draw(mask)
-            mask_draw.ellipse([(0, 0), (size, size)], fill=255)
-            
-            # 应用圆形遮罩
-            avatar_circle = Image.new('RGBA', (size, size), (0, 0, 0, 0))
-            avatar_circle.paste(avatar, (0, 0), mask)
-            
-            # 绘制头像
-            img.paste(avatar_circle, (x, y), avatar_circle)
+    assets = assets or UserAssets(mid)
+    try:
+        avatar = assets.circle_sprite('face', size)
+        if avatar is not None:
+            # 绘制头像（在RGBA画布上原地合成）
+            img.alpha_composite(avatar, (x, y))
             return True
-        except Exception as e:
-            print(f"加载头像失败: {e}")
+    except Exception as e:
+        print(f"加载头像失败: {e}")
     
     # 绘制默认头像
     draw.ellipse([(x, y), (x+size, y+size)], fill=(200, 200, 200))
@@ -48,9 +37,8 @@ def draw_user_basic_info(draw, user_data, mid, x=150, y=160, fonts=None):
     
     name = user_data.get('name', '未知用户')
     
-    # 处理长用户名 - 使用textwrap进行换行
-    name_lines = textwrap.wrap(name, width=15)  # 每行最多15个字符
-    name_lines = name_lines[:2]  # 最多显示2行
+    # 处理长用户名 - 按像素宽度换行，最多显示2行
+    name_lines = wrap_text(fonts['name'], name, NAME_MAX_WIDTH, max_lines=2)
     
     name_y = y
     for i, line in enumerate(name_lines):
@@ -98,10 +86,8 @@ def draw_user_details(draw, user_data, start_y, x=50, fonts=None):
     # 添加"签名："前缀
     sign_with_prefix = f"签名: {sign}"
     
-    # 使用textwrap处理长签名
-    max_chars_per_line = 40  # 每行最多字符数
-    sign_lines = textwrap.wrap(sign_with_prefix, width=max_chars_per_line)
-    sign_lines = sign_lines[:3]  # 最多显示3行
+    # 按像素宽度处理长签名，最多显示3行
+    sign_lines = wrap_text(fonts['normal'], sign_with_prefix, DETAIL_MAX_WIDTH, max_lines=3)
     
     for i, line in enumerate(sign_lines):
         safe_text_draw(draw, (x, y_offset + 30 + i*25), line, fill=(100, 100, 100), font=fonts['normal'])
@@ -114,8 +100,7 @@ def draw_user_details(draw, user_data, start_y, x=50, fonts=None):
     if official_title:
         # 处理头衔显示 - 使用淡金黄色 (255, 215, 0)
         title_with_prefix = f"头衔: {official_title}"
-        title_lines = textwrap.wrap(title_with_prefix, width=max_chars_per_line)
-        title_lines = title_lines[:2]  # 最多显示2行
+        title_lines = wrap_text(fonts['normal'], title_with_prefix, DETAIL_MAX_WIDTH, max_lines=2)
         
         for i, line in enumerate(title_lines):
             safe_text_draw(draw, (x, y_offset + i*25), line, fill=(255, 215, 0), font=fonts['normal'])
@@ -126,8 +111,7 @@ def draw_user_details(draw, user_data, start_y, x=50, fonts=None):
     if attestation_title:
         # 处理认证信息显示 - 使用淡蓝色 (100, 150, 255)
         attestation_with_prefix = f"认证: {attestation_title}"
-        attestation_lines = textwrap.wrap(attestation_with_prefix, width=max_chars_per_line)
-        attestation_lines = attestation_lines[:2]  # 最多显示2行
+        attestation_lines = wrap_text(fonts['normal'], attestation_with_prefix, DETAIL_MAX_WIDTH, max_lines=2)
         
         for i, line in enumerate(attestation_lines):
             safe_text_draw(draw, (x, y_offset + i*25), line, fill=(100, 150, 255), font=fonts['normal'])
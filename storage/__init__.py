@@ -0,0 +1,88 @@
+# 用户数据存储模块
+import threading
+from .json_store import JsonStore
+from .sqlite_store import SqliteStore
+from .snapshots import SnapshotStore, SNAPSHOT_FIELDS
+from .image_store import ImageStore
+
+# 存储后端：'sqlite'（默认，所有用户保存在一个数据库中）或 'json'（每个用户一个JSON文件）
+STORAGE_BACKEND = 'sqlite'
+DATA_DIR = "data"
+SQLITE_PATH = "data/users.db"
+# 粉丝数、关注数、播放量、点赞数的历史快照文件
+SNAPSHOT_PATH = "data/snapshots.bin"
+# 按内容寻址的图片存储目录和索引
+IMAGE_ASSET_DIR = "img/assets"
+IMAGE_INDEX_PATH = "img/assets/index.db"
+
+_storage = None
+_snapshot_store = None
+_image_store = None
+_storage_lock = threading.Lock()
+
+def _create_storage(backend):
+    if backend == 'json':
+        return JsonStore(DATA_DIR)
+    if backend == 'sqlite':
+        store = SqliteStore(SQLITE_PATH)
+        # 第一次使用数据库时导入旧的JSON数据文件
+        if store.count() == 0:
+            imported = store.import_from(JsonStore(DATA_DIR))
+            if imported:
+                print(f"已从 {DATA_DIR}/ 导入 {imported} 个用户数据到 {SQLITE_PATH}")
+        return store
+    raise ValueError(f"未知的存储后端: {backend}")
+
+def get_storage():
+    """
+    获取全局共享的用户数据存储
+    """
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = _create_storage(STORAGE_BACKEND)
+    return _storage
+
+def get_snapshot_store():
+    """
+    获取全局共享的计数快照存储
+    """
+    global _snapshot_store
+    if _snapshot_store is None:
+        with _storage_lock:
+            if _snapshot_store is None:
+                _snapshot_store = SnapshotStore(SNAPSHOT_PATH)
+    return _snapshot_store
+
+def get_image_store():
+    """
+    获取全局共享的图片存储
+    """
+    global _image_store
+    if _image_store is None:
+        with _storage_lock:
+            if _image_store is None:
+                _image_store = ImageStore(IMAGE_ASSET_DIR, IMAGE_INDEX_PATH)
+    return _image_store
+
+def configure_storage(backend):
+    """
+    切换存储后端（'sqlite' 或 'json'），下次调用get_storage时生效
+    """
+    global _storage, STORAGE_BACKEND
+    with _storage_lock:
+        STORAGE_BACKEND = backend
+        _storage = None
+
+__all__ = [
+    'JsonStore',
+    'SqliteStore',
+    'SnapshotStore',
+    'ImageStore',
+    'SNAPSHOT_FIELDS',
+    'get_storage',
+    'get_snapshot_store',
+    'get_image_store',
+    'configure_storage'
+]
@@ -0,0 +1,264 @@
+import os
+import hashlib
+import sqlite3
+import threading
+import time
+import uuid
+
+# 旧版本按用户保存图片时使用的扩展名
+LEGACY_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.webp']
+
+class ImageStore:
+    """
+    按内容寻址的图片存储：每个图片按内容的SHA-256只保存一份（img/assets/{hash}{ext}），
+    URL -> 内容哈希的映射避免重复下载，用户通过 (mid, 类型) 引用图片，
+    删除用户时只释放引用，没有任何用户引用的图片才会被删除
+    """
+
+    def __init__(self, asset_dir="img/assets", index_path="img/assets/index.db"):
+        self.asset_dir = asset_dir
+        self.index_path = index_path
+        self._local = threading.local()
+        # 修改引用和删除文件需要串行，避免删除刚被其他用户引用的图片
+        self._lock = threading.Lock()
+        os.makedirs(asset_dir, exist_ok=True)
+        self._init_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS assets (
+                    hash TEXT PRIMARY KEY,
+                    ext TEXT NOT NULL,
+                    size INTEGER NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS urls (
+                    url TEXT PRIMARY KEY,
+                    hash TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    checked_at REAL
+                )
+            """)
+            # 旧版本的索引没有缓存校验字段
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(urls)")}
+            for column, column_type in (('etag', 'TEXT'), ('last_modified', 'TEXT'), ('checked_at', 'REAL')):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE urls ADD COLUMN {column} {column_type}")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS refs (
+                    mid INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    PRIMARY KEY (mid, kind)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_refs_hash ON refs (hash)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_urls_hash ON urls (hash)")
+
+    def asset_path(self, content_hash, ext):
+        return os.path.join(self.asset_dir, f"{content_hash}{ext}")
+
+    def temp_path(self):
+        """
+        下载中的临时文件路径（与图片在同一目录，保证可以原子重命名）
+        """
+        return os.path.join(self.asset_dir, f"{uuid.uuid4().hex}.tmp")
+
+    def _lookup_url(self, conn, url, max_age=None):
+        row = conn.execute("""
+            SELECT assets.hash, assets.ext, urls.checked_at FROM urls JOIN assets ON assets.hash = urls.hash
+            WHERE urls.url = ?
+        """, (url,)).fetchone()
+        if row is None or not os.path.exists(self.asset_path(row[0], row[1])):
+            return None
+        if max_age is not None and (row[2] or 0) < time.time() - max_age:
+            return None
+        return row[0]
+
+    def get_validators(self, url):
+        """
+        返回URL上次下载时服务器给出的 (ETag, Last-Modified)，用于条件请求；没有记录时返回None
+        """
+        row = self._connect().execute("""
+            SELECT urls.etag, urls.last_modified, assets.hash, assets.ext
+            FROM urls JOIN assets ON assets.hash = urls.hash
+            WHERE urls.url = ?
+        """, (url,)).fetchone()
+        if row is None or not (row[0] or row[1]) or not os.path.exists(self.asset_path(row[2], row[3])):
+            return None
+        return row[0], row[1]
+
+    def _set_ref(self, conn, mid, kind, content_hash):
+        row = conn.execute("SELECT hash FROM refs WHERE mid = ? AND kind = ?", (mid, kind)).fetchone()
+        if row is not None and row[0] == content_hash:
+            return
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO refs (mid, kind, hash) VALUES (?, ?, ?)",
+                         (mid, kind, content_hash))
+        # 替换掉的旧图片在无人引用时删除
+        if row is not None:
+            self._collect(conn, [row[0]])
+
+    def link_url(self, mid, kind, url, max_age=None):
+        """
+        URL对应的图片已经保存过时，直接让用户引用它并返回内容哈希；否则返回None（需要下载）
+        max_age不为None时，超过max_age秒没有向服务器确认过的图片也返回None（需要条件请求）
+        """
+        with self._lock:
+            conn = self._connect()
+            content_hash = self._lookup_url(conn, url, max_age)
+            if content_hash is not None:
+                self._set_ref(conn, mid, kind, content_hash)
+            return content_hash
+
+    def mark_not_modified(self, mid, kind, url):
+        """
+        条件请求返回304时调用：记录确认时间并让用户引用已保存的图片，
+        返回内容哈希；图片已被删除时返回None（需要重新下载）
+        """
+        with self._lock:
+            conn = self._connect()
+            content_hash = self._lookup_url(conn, url)
+            if content_hash is not None:
+                with conn:
+                    conn.execute("UPDATE urls SET checked_at = ? WHERE url = ?", (time.time(), url))
+                self._set_ref(conn, mid, kind, content_hash)
+            return content_hash
+
+    def store(self, mid, kind, url, content, ext):
+        """
+        保存下载的图片内容并让用户引用它（kind为face/pendant/nameplate），返回内容哈希
+        """
+        temp_path = self.temp_path()
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+        return self.store_file(mid, kind, url, temp_path, hashlib.sha256(content).hexdigest(), len(content), ext)
+
+    def store_file(self, mid, kind, url, temp_path, content_hash, size, ext, etag=None, last_modified=None):
+        """
+        把已经写入临时文件的图片原子地移动到 img/assets/{hash}{ext} 并让用户引用它，
+        内容相同的图片只保存一份（临时文件会被删除），同时记录用于条件请求的ETag/Last-Modified
+        """
+        path = self.asset_path(content_hash, ext)
+
+        with self._lock:
+            conn = self._connect()
+            existing = conn.execute("SELECT ext FROM assets WHERE hash = ?", (content_hash,)).fetchone()
+            if existing is not None and os.path.exists(self.asset_path(content_hash, existing[0])):
+                ext = existing[0]
+                os.remove(temp_path)
+            elif os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, path)
+
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO assets (hash, ext, size) VALUES (?, ?, ?)",
+                             (content_hash, ext, size))
+                conn.execute("""
+                    INSERT OR REPLACE INTO urls (url, hash, etag, last_modified, checked_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (url, content_hash, etag, last_modified, time.time()))
+            self._set_ref(conn, mid, kind, content_hash)
+        return content_hash
+
+    def release(self, mid):
+        """
+        释放用户的所有图片引用，删除不再被任何用户引用的图片，返回删除的文件数
+        """
+        with self._lock:
+            conn = self._connect()
+            hashes = [row[0] for row in conn.execute("SELECT hash FROM refs WHERE mid = ?", (mid,))]
+            if not hashes:
+                return 0
+            with conn:
+                conn.execute("DELETE FROM refs WHERE mid = ?", (mid,))
+            return self._collect(conn, hashes)
+
+    def retain(self, mid, kinds):
+        """
+        只保留用户指定类型的图片引用（例如用户取消了头像框时删除旧的引用）
+        """
+        kinds = set(kinds)
+        with self._lock:
+            conn = self._connect()
+            stale = [(kind, content_hash) for kind, content_hash in
+                     conn.execute("SELECT kind, hash FROM refs WHERE mid = ?", (mid,))
+                     if kind not in kinds]
+            if not stale:
+                return 0
+            with conn:
+                conn.executemany("DELETE FROM refs WHERE mid = ? AND kind = ?",
+                                 [(mid, kind) for kind, _ in stale])
+            return self._collect(conn, [content_hash for _, content_hash in stale])
+
+    def _collect(self, conn, hashes):
+        """
+        删除引用计数为0的图片文件及其索引（调用者需持有锁）
+        """
+        removed = 0
+        for content_hash in set(hashes):
+            refcount = conn.execute("SELECT COUNT(*) FROM refs WHERE hash = ?", (content_hash,)).fetchone()[0]
+            if refcount:
+                continue
+            row = conn.execute("SELECT ext FROM assets WHERE hash = ?", (content_hash,)).fetchone()
+            with conn:
+                conn.execute("DELETE FROM urls WHERE hash = ?", (content_hash,))
+                conn.execute("DELETE FROM assets WHERE hash = ?", (content_hash,))
+            if row is not None:
+                try:
+                    os.remove(self.asset_path(content_hash, row[0]))
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+    def get_ref(self, mid, kind):
+        """
+        返回用户图片的 (内容哈希, 文件路径)，没有引用时返回None
+        """
+        row = self._connect().execute("""
+            SELECT assets.hash, assets.ext FROM refs JOIN assets ON assets.hash = refs.hash
+            WHERE refs.mid = ? AND refs.kind = ?
+        """, (mid, kind)).fetchone()
+        if row is None:
+            return None
+        return row[0], self.asset_path(*row)
+
+    def user_bytes(self, mid):
+        """
+        用户引用的图片占用的字节数，共享的图片按引用数平摊
+        """
+        row = self._connect().execute("""
+            SELECT SUM(CAST(assets.size AS REAL) /
+                       (SELECT COUNT(*) FROM refs AS shared WHERE shared.hash = refs.hash))
+            FROM refs JOIN assets ON assets.hash = refs.hash
+            WHERE refs.mid = ?
+        """, (mid,)).fetchone()
+        return int(row[0] or 0)
+
+    def find_user_image(self, mid, kind):
+        """
+        查找用户图片的文件路径：优先使用内容寻址存储，其次兼容旧版本的 img/{mid}_{kind}{ext}
+        """
+        ref = self.get_ref(mid, kind)
+        if ref is not None:
+            return ref[1]
+        for ext in LEGACY_EXTENSIONS:
+            path = f"img/{mid}_{kind}{ext}"
+            if os.path.exists(path):
+                return path
+        return None
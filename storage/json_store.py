@@ -0,0 +1,106 @@
+import os
+import json
+import threading
+
+class JsonStore:
+    """
+    JSON文件存储：每个用户一个 data/{mid}_data.json 文件（原有的存储格式）
+    """
+
+    def __init__(self, data_dir="data"):
+        self.data_dir = data_dir
+
+    def _path(self, mid):
+        return os.path.join(self.data_dir, f"{mid}_data.json")
+
+    def load(self, mid):
+        """
+        加载用户数据，不存在时返回None
+        """
+        return self.load_with_size(mid)[0]
+
+    def load_with_size(self, mid):
+        """
+        加载用户数据，返回 (数据, 读取的字节数)，不存在时返回 (None, 0)
+        """
+        path = self._path(mid)
+        try:
+            with open(path, 'rb') as f:
+                content = f.read()
+            data = json.loads(content.decode('utf-8'))
+        except FileNotFoundError:
+            return None, 0
+        except Exception as e:
+            print(f"加载数据文件失败: {e}")
+            return None, 0
+
+        # 旧版本保存的数据没有查询时间，使用文件修改时间代替
+        if 'fetched_at' not in data:
+            data['fetched_at'] = os.path.getmtime(path)
+        return data, len(content)
+
+    def load_many(self, mids):
+        """
+        批量加载用户数据，返回 {mid: 数据}，不存在的用户不包含在结果中
+        """
+        records = {}
+        for mid in mids:
+            data = self.load(mid)
+            if data is not None:
+                records[mid] = data
+        return records
+
+    def save(self, mid, record):
+        """
+        保存用户数据（先写临时文件再替换，避免并发读取到写了一半的文件）
+        """
+        os.makedirs(self.data_dir, exist_ok=True)
+        path = self._path(mid)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+
+    def save_many(self, records):
+        """
+        批量保存用户数据，records为 {mid: 数据}
+        """
+        for mid, record in records.items():
+            self.save(mid, record)
+
+    def exists(self, mid):
+        return os.path.exists(self._path(mid))
+
+    def delete(self, mid):
+        """
+        删除用户数据，返回是否删除了数据
+        """
+        try:
+            os.remove(self._path(mid))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def size_of(self, mid):
+        """
+        用户数据占用的字节数
+        """
+        try:
+            return os.path.getsize(self._path(mid))
+        except OSError:
+            return 0
+
+    def mids(self):
+        """
+        所有已保存的用户MID
+        """
+        if not os.path.isdir(self.data_dir):
+            return []
+        result = []
+        for name in os.listdir(self.data_dir):
+            if name.endswith('_data.json') and name[:-len('_data.json')].isdigit():
+                result.append(int(name[:-len('_data.json')]))
+        return result
+
+    def describe(self, mid):
+        return self._path(mid)
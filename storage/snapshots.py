@@ -0,0 +1,131 @@
+import os
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+# 每条快照记录：mid, 时间戳, 粉丝数, 关注数, 播放量, 点赞数（小端，定长48字节）
+RECORD_FORMAT = struct.Struct('<qdqqqq')
+# 快照中记录的计数字段
+SNAPSHOT_FIELDS = ('follower', 'following', 'view', 'likes')
+# 计数缺失时保存的值
+MISSING = -1
+
+class SnapshotSeries:
+    """
+    单个用户的时间序列，按列保存在紧凑的数组中（时间戳按写入顺序递增）
+    """
+
+    __slots__ = ('timestamp',) + SNAPSHOT_FIELDS
+
+    def __init__(self):
+        self.timestamp = array('d')
+        for field in SNAPSHOT_FIELDS:
+            setattr(self, field, array('q'))
+
+    def append(self, timestamp, values):
+        self.timestamp.append(timestamp)
+        for field, value in zip(SNAPSHOT_FIELDS, values):
+            getattr(self, field).append(value)
+
+    def __len__(self):
+        return len(self.timestamp)
+
+class SnapshotStore:
+    """
+    只追加的计数快照存储：所有快照顺序写入一个二进制文件，加载后按用户组织成列式数组
+    """
+
+    def __init__(self, path="data/snapshots.bin"):
+        self.path = path
+        self._series = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """
+        第一次使用时读取整个快照文件（调用者需持有锁）
+        """
+        if self._series is not None:
+            return
+        series = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                content = f.read()
+            # 忽略进程中断时可能写了一半的最后一条记录
+            usable = len(content) - len(content) % RECORD_FORMAT.size
+            for mid, timestamp, *values in RECORD_FORMAT.iter_unpack(content[:usable]):
+                series.setdefault(mid, SnapshotSeries()).append(timestamp, values)
+        self._series = series
+
+    def append(self, mid, record, timestamp=None):
+        """
+        记录一次快照，record为包含follower/following/view/likes的用户数据
+        """
+        timestamp = timestamp if timestamp is not None else record.get('fetched_at') or time.time()
+        values = []
+        for field in SNAPSHOT_FIELDS:
+            value = record.get(field)
+            values.append(int(value) if value is not None else MISSING)
+
+        with self._lock:
+            self._load()
+            series = self._series.setdefault(mid, SnapshotSeries())
+            if len(series) and timestamp < series.timestamp[-1]:
+                # 保证时间戳递增，便于二分查找
+                timestamp = series.timestamp[-1]
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'ab') as f:
+                f.write(RECORD_FORMAT.pack(mid, timestamp, *values))
+            series.append(timestamp, values)
+
+    def get_series(self, mid, since=None, until=None):
+        """
+        获取用户在时间范围内的快照，返回 {'timestamp': [...], 'follower': [...], ...}
+        """
+        with self._lock:
+            self._load()
+            series = self._series.get(mid)
+            if series is None:
+                return {field: [] for field in ('timestamp',) + SNAPSHOT_FIELDS}
+            start = bisect_left(series.timestamp, since) if since is not None else 0
+            end = bisect_right(series.timestamp, until) if until is not None else len(series)
+            return {field: getattr(series, field)[start:end].tolist()
+                    for field in ('timestamp',) + SNAPSHOT_FIELDS}
+
+    def growth(self, mids, window, now=None):
+        """
+        批量计算多个用户在最近window秒内的增长量，
+        以窗口开始前最后一次快照（没有则为窗口内第一次快照）为基准，与最新快照相减
+        返回 {mid: {'follower': 增量, ...}}，没有快照的用户不包含在结果中，
+        基准或最新值缺失的字段为None
+        """
+        now = now if now is not None else time.time()
+        window_start = now - window
+        result = {}
+        with self._lock:
+            self._load()
+            for mid in mids:
+                series = self._series.get(mid)
+                if not series:
+                    continue
+                end = bisect_right(series.timestamp, now) - 1
+                if end < 0:
+                    continue
+                base = max(bisect_right(series.timestamp, window_start) - 1, 0)
+                deltas = {}
+                for field in SNAPSHOT_FIELDS:
+                    column = getattr(series, field)
+                    first, last = column[base], column[end]
+                    deltas[field] = None if MISSING in (first, last) else last - first
+                deltas['since'] = series.timestamp[base]
+                deltas['until'] = series.timestamp[end]
+                result[mid] = deltas
+        return result
+
+    def mids(self):
+        with self._lock:
+            self._load()
+            return list(self._series)
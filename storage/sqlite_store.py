@@ -0,0 +1,143 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+
+class SqliteStore:
+    """
+    SQLite存储：所有用户数据保存在一个数据库文件中（WAL模式），
+    按MID主键索引查找，支持批量写入和批量读取
+    """
+
+    # 单条SQL中IN (...)参数的最大数量
+    BATCH_SIZE = 500
+
+    def __init__(self, path="data/users.db"):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_schema()
+
+    def _connect(self):
+        """
+        每个线程使用独立的连接（sqlite3连接不能跨线程共享）
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    mid INTEGER PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    fetched_at REAL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_users_fetched_at ON users (fetched_at)")
+
+    def load(self, mid):
+        """
+        加载用户数据，不存在时返回None
+        """
+        return self.load_with_size(mid)[0]
+
+    def load_with_size(self, mid):
+        """
+        加载用户数据，返回 (数据, 读取的字节数)，不存在时返回 (None, 0)
+        """
+        row = self._connect().execute("SELECT data, length(CAST(data AS BLOB)) FROM users WHERE mid = ?",
+                                      (mid,)).fetchone()
+        if row is None:
+            return None, 0
+        return json.loads(row[0]), row[1]
+
+    def load_many(self, mids):
+        """
+        批量加载用户数据，返回 {mid: 数据}，不存在的用户不包含在结果中
+        """
+        mids = list(mids)
+        records = {}
+        conn = self._connect()
+        for start in range(0, len(mids), self.BATCH_SIZE):
+            batch = mids[start:start + self.BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(f"SELECT mid, data FROM users WHERE mid IN ({placeholders})", batch)
+            for mid, data in rows:
+                records[mid] = json.loads(data)
+        return records
+
+    def save(self, mid, record):
+        """
+        保存（插入或更新）用户数据
+        """
+        self.save_many({mid: record})
+
+    def save_many(self, records):
+        """
+        在一个事务中批量保存用户数据，records为 {mid: 数据}
+        """
+        now = time.time()
+        rows = [(mid, json.dumps(record, ensure_ascii=False), record.get('fetched_at'), now)
+                for mid, record in records.items()]
+        conn = self._connect()
+        with conn:
+            conn.executemany("""
+                INSERT INTO users (mid, data, fetched_at, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(mid) DO UPDATE SET
+                    data = excluded.data,
+                    fetched_at = excluded.fetched_at,
+                    updated_at = excluded.updated_at
+            """, rows)
+
+    def exists(self, mid):
+        row = self._connect().execute("SELECT 1 FROM users WHERE mid = ?", (mid,)).fetchone()
+        return row is not None
+
+    def delete(self, mid):
+        """
+        删除用户数据，返回是否删除了数据
+        """
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute("DELETE FROM users WHERE mid = ?", (mid,))
+        return cursor.rowcount > 0
+
+    def size_of(self, mid):
+        """
+        用户数据占用的字节数（按保存的JSON文本长度估算）
+        """
+        row = self._connect().execute("SELECT length(CAST(data AS BLOB)) FROM users WHERE mid = ?", (mid,)).fetchone()
+        return row[0] if row else 0
+
+    def mids(self):
+        """
+        所有已保存的用户MID
+        """
+        return [row[0] for row in self._connect().execute("SELECT mid FROM users")]
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def describe(self, mid):
+        return f"{self.path}#{mid}"
+
+    def import_from(self, other_store):
+        """
+        从其他存储（例如旧的JSON文件）批量导入用户数据，返回导入的数量
+        """
+        mids = other_store.mids()
+        for start in range(0, len(mids), self.BATCH_SIZE):
+            batch = mids[start:start + self.BATCH_SIZE]
+            self.save_many(other_store.load_many(batch))
+        return len(mids)
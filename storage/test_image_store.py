@@ -0,0 +1,77 @@
+import os
+import time
+import pytest
+from storage import ImageStore
+
+URL_A = 'https://i0.hdslb.com/bfs/face/a.jpg'
+URL_B = 'https://i0.hdslb.com/bfs/face/b.jpg'
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ImageStore(str(tmp_path / 'assets'), str(tmp_path / 'assets' / 'index.db'))
+
+
+def asset_files(store):
+    return sorted(name for name in os.listdir(store.asset_dir) if not name.startswith('index.db'))
+
+
+def test_same_content_stored_once(store):
+    first = store.store(1, 'face', URL_A, b'image', '.jpg')
+    second = store.store(2, 'face', URL_B, b'image', '.jpg')
+    assert first == second
+    assert len(asset_files(store)) == 1
+    assert store.get_ref(1, 'face') == store.get_ref(2, 'face')
+
+
+def test_release_keeps_shared_images(store):
+    store.store(1, 'face', URL_A, b'image', '.jpg')
+    store.store(2, 'face', URL_A, b'image', '.jpg')
+    assert store.release(1) == 0
+    assert len(asset_files(store)) == 1
+    # 最后一个引用释放后删除图片和URL记录
+    assert store.release(2) == 1
+    assert asset_files(store) == []
+    assert store.link_url(3, 'face', URL_A) is None
+
+
+def test_replaced_image_collected(store):
+    store.store(1, 'face', URL_A, b'old', '.jpg')
+    store.store(1, 'face', URL_B, b'new', '.jpg')
+    assert len(asset_files(store)) == 1
+    assert store.get_ref(1, 'face')[1].endswith('.jpg')
+
+
+def test_retain_releases_dropped_kinds(store):
+    store.store(1, 'face', URL_A, b'face', '.jpg')
+    store.store(1, 'pendant', URL_B, b'pendant', '.png')
+    assert store.retain(1, ['face']) == 1
+    assert store.get_ref(1, 'pendant') is None
+    assert store.get_ref(1, 'face') is not None
+
+
+def test_link_url_reuses_download(store):
+    content_hash = store.store(1, 'face', URL_A, b'image', '.jpg')
+    assert store.link_url(2, 'face', URL_A) == content_hash
+    assert store.get_ref(2, 'face')[0] == content_hash
+    assert store.user_bytes(1) == store.user_bytes(2) == len(b'image') // 2
+
+
+def test_link_url_requires_revalidation_after_max_age(store, monkeypatch):
+    store.store(1, 'face', URL_A, b'image', '.jpg')
+    assert store.link_url(2, 'face', URL_A, max_age=60) is not None
+    later = time.time() + 120
+    monkeypatch.setattr(time, 'time', lambda: later)
+    assert store.link_url(2, 'face', URL_A, max_age=60) is None
+    # 304确认后重新计时
+    assert store.mark_not_modified(2, 'face', URL_A) is not None
+    assert store.link_url(2, 'face', URL_A, max_age=60) is not None
+
+
+def test_validators(store):
+    temp_path = store.temp_path()
+    with open(temp_path, 'wb') as f:
+        f.write(b'image')
+    store.store_file(1, 'face', URL_A, temp_path, 'abc', 5, '.jpg', etag='"v1"', last_modified=None)
+    assert store.get_validators(URL_A) == ('"v1"', None)
+    assert store.get_validators(URL_B) is None
@@ -0,0 +1,75 @@
+import pytest
+from storage.snapshots import SnapshotStore, RECORD_FORMAT, MISSING
+
+DAY = 24 * 60 * 60
+
+
+def record(follower, following=10, view=100, likes=5):
+    return {'follower': follower, 'following': following, 'view': view, 'likes': likes}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SnapshotStore(str(tmp_path / 'snapshots.bin'))
+
+
+def test_growth_uses_last_snapshot_before_window(store):
+    store.append(2, record(100), timestamp=0)
+    store.append(2, record(150), timestamp=5 * DAY)
+    store.append(2, record(170), timestamp=9 * DAY)
+    store.append(2, record(200), timestamp=10 * DAY)
+    growth = store.growth([2], DAY, now=10 * DAY)[2]
+    # 窗口开始（第9天）时最后一次快照为基准
+    assert growth['follower'] == 30
+    assert growth['since'] == 9 * DAY
+    assert growth['until'] == 10 * DAY
+    assert store.growth([2], 7 * DAY, now=10 * DAY)[2]['follower'] == 100
+
+
+def test_growth_falls_back_to_first_snapshot_in_window(store):
+    store.append(2, record(100), timestamp=9.5 * DAY)
+    store.append(2, record(120), timestamp=10 * DAY)
+    growth = store.growth([2], 30 * DAY, now=10 * DAY)[2]
+    assert growth['follower'] == 20
+    assert growth['since'] == 9.5 * DAY
+
+
+def test_growth_ignores_snapshots_after_now(store):
+    store.append(2, record(100), timestamp=0)
+    store.append(2, record(150), timestamp=DAY)
+    store.append(2, record(999), timestamp=3 * DAY)
+    assert store.growth([2], 2 * DAY, now=2 * DAY)[2]['follower'] == 50
+
+
+def test_growth_skips_users_without_snapshots(store):
+    store.append(2, record(100), timestamp=DAY)
+    assert set(store.growth([2, 3], DAY, now=DAY)) == {2}
+    # now早于第一次快照
+    assert store.growth([2], DAY, now=0) == {}
+
+
+def test_missing_values(store):
+    store.append(2, {'follower': 100, 'following': None}, timestamp=0)
+    store.append(2, record(110, following=20), timestamp=DAY)
+    assert store.get_series(2)['following'] == [MISSING, 20]
+    growth = store.growth([2], 2 * DAY, now=DAY)[2]
+    # 基准或最新值缺失的字段为None
+    assert growth['following'] is None
+    assert growth['view'] is None
+    assert growth['follower'] == 10
+
+
+def test_reload_ignores_partial_record(store):
+    store.append(2, record(100), timestamp=0)
+    store.append(2, record(110), timestamp=DAY)
+    with open(store.path, 'ab') as f:
+        f.write(b'\x00' * (RECORD_FORMAT.size // 2))
+    reloaded = SnapshotStore(store.path)
+    assert reloaded.get_series(2)['follower'] == [100, 110]
+    assert reloaded.get_series(2, since=DAY)['follower'] == [110]
+
+
+def test_timestamps_kept_monotonic(store):
+    store.append(2, record(100), timestamp=DAY)
+    store.append(2, record(110), timestamp=0)
+    assert store.get_series(2)['timestamp'] == [DAY, DAY]
@@ -0,0 +1,26 @@
+import os
+import pytest
+from storage import JsonStore, SqliteStore
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'json':
+        return JsonStore(str(tmp_path))
+    return SqliteStore(str(tmp_path / 'users.db'))
+
+
+def test_load_with_size(store):
+    record = {'name': '测试用户', 'follower': 10, 'fetched_at': 1.0}
+    store.save(2, record)
+    data, size = store.load_with_size(2)
+    assert data == record
+    if isinstance(store, JsonStore):
+        assert size == os.path.getsize(store._path(2))
+    else:
+        assert size == store.size_of(2)
+    assert store.load(2) == record
+
+
+def test_load_with_size_missing(store):
+    assert store.load_with_size(3) == (None, 0)
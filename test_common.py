@@ -0,0 +1,298 @@
+import threading
+import pytest
+import common
+
+
+@pytest.fixture
+def fake_render(monkeypatch):
+    # 不访问存储和渲染进程：加载数据总是需要重新绘制，保存卡片总是成功
+    monkeypatch.setattr(common, '_prepare_card', lambda mid, force=False: ({'mid': mid}, 'digest'))
+    monkeypatch.setattr(common, '_store_card', lambda mid, card_bytes, digest: True)
+    monkeypatch.setattr(common, 'card_cache', {})
+    monkeypatch.setattr(common, 'CARD_SAVE_TO_DISK', False)
+    monkeypatch.setattr(common, '_data_generations', {})
+    monkeypatch.setattr(common, '_current_cards', common.LRUCache(16))
+    sized = []
+    monkeypatch.setattr(common, 'update_history_size', sized.append)
+    return sized
+
+
+def test_render_marks_card_current(fake_render, monkeypatch):
+    monkeypatch.setattr(common, 'render_card', lambda mid, user_data: b'card')
+    assert common.render_user_card(2)
+    assert common._is_card_current(2)
+
+
+def test_render_updates_history_size(fake_render, monkeypatch):
+    # 按需绘制的卡片保存到磁盘后计入用户的磁盘占用
+    monkeypatch.setattr(common, 'CARD_SAVE_TO_DISK', True)
+    monkeypatch.setattr(common, 'render_card', lambda mid, user_data: b'card')
+    common.render_user_card(2)
+    assert fake_render == [2]
+
+
+def test_skipped_render_keeps_history_size(fake_render, monkeypatch):
+    monkeypatch.setattr(common, 'CARD_SAVE_TO_DISK', True)
+    monkeypatch.setattr(common, '_prepare_card', lambda mid, force=False: (None, 'digest'))
+    assert common.render_user_card(2)
+    assert fake_render == []
+
+
+def test_save_during_render_keeps_card_stale(fake_render, monkeypatch):
+    # 绘制旧数据期间保存了新数据：绘制完成后不能把卡片标记为最新
+    def render_while_saving(mid, user_data):
+        common._bump_data_generation(mid)
+        return b'card'
+    monkeypatch.setattr(common, 'render_card', render_while_saving)
+    assert common.render_user_card(2)
+    assert not common._is_card_current(2)
+
+
+def test_save_after_render_invalidates_card(fake_render, monkeypatch):
+    monkeypatch.setattr(common, 'render_card', lambda mid, user_data: b'card')
+    common.render_user_card(2)
+    common._bump_data_generation(2)
+    assert not common._is_card_current(2)
+
+
+@pytest.fixture
+def history(monkeypatch):
+    query_history = common.QueryHistory(max_entries=1, max_bytes=10 ** 9, policy='lru')
+    monkeypatch.setattr(common, '_query_history', query_history)
+    monkeypatch.setattr(common, '_history_dirty', False)
+    deleted = []
+    monkeypatch.setattr(common, 'delete_user_data', deleted.append)
+    query_history.deleted = deleted
+    return query_history
+
+
+def test_evicted_user_deleted(history):
+    common.manage_query_history(1)
+    common.manage_query_history(2)
+    assert history.deleted == [1]
+    assert list(history.entries) == [2]
+
+
+def test_requeried_victim_not_deleted(history):
+    # 淘汰后、删除前再次查询的用户保留数据
+    history.touch(1)
+    common._delete_evicted(history, [1])
+    assert history.deleted == []
+
+
+def test_requery_waits_for_deletion(history, monkeypatch):
+    started = threading.Event()
+    release = threading.Event()
+    deleted = []
+
+    def slow_delete(mid):
+        started.set()
+        release.wait(5)
+        deleted.append(mid)
+    monkeypatch.setattr(common, 'delete_user_data', slow_delete)
+
+    deleter = threading.Thread(target=common._delete_evicted, args=(history, [1]))
+    deleter.start()
+    assert started.wait(5)
+    requery = threading.Thread(target=common.manage_query_history, args=(1,))
+    requery.start()
+    requery.join(0.2)
+    # 删除完成之前再次查询不能继续（否则新保存的数据会被删除）
+    assert requery.is_alive()
+    release.set()
+    deleter.join(5)
+    requery.join(5)
+    assert deleted == [1]
+    assert 1 in history.entries
+
+
+def test_refresh_does_not_count_access(history):
+    history.max_entries = 10
+    common.manage_query_history(1)
+    common.manage_query_history(1, record_access=False)
+    assert history.entries[1]['hits'] == 1
+    # 不在记录中的用户仍然加入记录，保存的数据可以被淘汰
+    common.manage_query_history(2, record_access=False)
+    assert 2 in history.entries
+
+
+class FakeStorage:
+    def __init__(self, data, on_load=None):
+        self.data = data
+        self.on_load = on_load
+
+    def load_with_size(self, mid):
+        data = self.data
+        if self.on_load:
+            self.on_load(mid)
+        return data, 10
+
+
+@pytest.fixture
+def record_cache(monkeypatch):
+    cache = common.LRUCache(16)
+    monkeypatch.setattr(common, 'record_cache', cache)
+    monkeypatch.setattr(common, '_data_generations', {})
+    return cache
+
+
+def test_load_user_record_caches(record_cache, monkeypatch):
+    monkeypatch.setattr(common, 'get_storage', lambda: FakeStorage({'v': 1}))
+    assert common.load_user_record(2) == {'v': 1}
+    assert record_cache.get(2) == {'v': 1}
+
+
+def test_save_during_load_not_cached(record_cache, monkeypatch):
+    # 读取到旧数据之后保存了新数据：旧数据不能写入已清除的缓存
+    storage = FakeStorage({'v': 1}, on_load=common._bump_data_generation)
+    monkeypatch.setattr(common, 'get_storage', lambda: storage)
+    assert common.load_user_record(2) == {'v': 1}
+    assert 2 not in record_cache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        self.now += 1
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(common.time, 'time', clock.time)
+    return clock
+
+
+def test_lru_evicts_least_recently_used(clock):
+    history = common.QueryHistory(max_entries=2, max_bytes=10 ** 9, policy='lru')
+    history.touch(1)
+    history.touch(2)
+    history.touch(1)
+    history.touch(3)
+    assert history.evict(exclude=3) == [2]
+    assert set(history.entries) == {1, 3}
+
+
+def test_lfu_evicts_least_frequently_used(clock):
+    history = common.QueryHistory(max_entries=2, max_bytes=10 ** 9, policy='lfu')
+    for _ in range(3):
+        history.touch(1)
+    history.touch(2)
+    history.touch(2)
+    history.touch(1)
+    history.touch(3)
+    # 3刚被查询，不参与淘汰；2的访问次数少于1
+    assert history.evict(exclude=3) == [2]
+
+
+def test_lfu_ties_broken_by_last_access(clock):
+    history = common.QueryHistory(max_entries=2, max_bytes=10 ** 9, policy='lfu')
+    history.touch(1)
+    history.touch(2)
+    history.touch(3)
+    assert history.evict(exclude=3) == [1]
+
+
+def test_evict_by_bytes(clock):
+    history = common.QueryHistory(max_entries=100, max_bytes=1000, policy='lru')
+    for mid, size in ((1, 400), (2, 400), (3, 400)):
+        history.touch(mid)
+        history.set_size(mid, size)
+    assert history.evict(exclude=3) == [1]
+    assert history.total_bytes() == 800
+
+
+def test_evict_never_removes_excluded(clock):
+    history = common.QueryHistory(max_entries=100, max_bytes=100, policy='lru')
+    history.touch(1)
+    history.set_size(1, 1000)
+    assert history.evict(exclude=1) == []
+    assert 1 in history.entries
+
+
+def test_history_json_round_trip(clock):
+    history = common.QueryHistory()
+    history.touch(1)
+    history.set_size(1, 10)
+    restored = common.QueryHistory.from_json(history.to_json())
+    assert restored.entries == history.entries
+    # 旧版本格式：按查询顺序排列的MID列表，越靠后越新
+    legacy = common.QueryHistory.from_json([5, 6])
+    assert legacy.entries[5]['last_access'] < legacy.entries[6]['last_access']
+
+
+@pytest.fixture
+def card_files(monkeypatch, tmp_path):
+    cache = common.LRUCache(16)
+    monkeypatch.setattr(common, 'card_cache', cache)
+    monkeypatch.setattr(common, '_card_versions', {})
+    monkeypatch.setattr(common, 'CARD_SAVE_TO_DISK', True)
+    path = tmp_path / '2.png'
+    path.write_bytes(b'old card')
+    monkeypatch.setattr(common, 'card_path', lambda mid: str(path))
+    return cache
+
+
+def test_load_user_card_caches_file(card_files):
+    assert common.load_user_card(2) == b'old card'
+    assert card_files.get(2) == b'old card'
+
+
+def test_card_stored_during_read_not_overwritten(card_files, monkeypatch):
+    # 读取旧卡片文件期间保存了新卡片：旧卡片不能覆盖缓存中的新卡片
+    real_open = open
+
+    def open_then_store(path, mode='r', *args, **kwargs):
+        f = real_open(path, mode, *args, **kwargs)
+        common._store_card(2, b'new card', 'digest')
+        return f
+    monkeypatch.setattr(common, 'save_card_bytes', lambda mid, card_bytes, digest=None: 'output')
+    monkeypatch.setattr(common, 'open', open_then_store, raising=False)
+    assert common.load_user_card(2) == b'old card'
+    assert card_files.get(2) == b'new card'
+
+
+def test_memory_only_cards_ignore_leftover_files(card_files, monkeypatch):
+    monkeypatch.setattr(common, 'CARD_SAVE_TO_DISK', False)
+    assert common.load_user_card(2) is None
+    assert 2 not in card_files
+
+
+class DeletedStorage:
+    def delete(self, mid):
+        return False
+
+    def release(self, mid):
+        return 0
+
+
+def test_delete_forgets_versions(monkeypatch):
+    monkeypatch.setattr(common, '_data_generations', {})
+    monkeypatch.setattr(common, '_card_versions', {})
+    monkeypatch.setattr(common, 'card_cache', common.LRUCache(16))
+    monkeypatch.setattr(common, 'CARD_SAVE_TO_DISK', False)
+    monkeypatch.setattr(common, 'get_storage', DeletedStorage)
+    monkeypatch.setattr(common, 'get_image_store', DeletedStorage)
+    monkeypatch.setattr(common, 'card_paths', lambda mid: [])
+    common._bump_data_generation(2)
+    common._store_card(2, b'card', 'digest')
+    assert 2 in common._data_generations and 2 in common._card_versions
+    common.delete_user_data(2)
+    # 被淘汰用户的版本号不再保留
+    assert 2 not in common._data_generations
+    assert 2 not in common._card_versions
+
+
+def test_render_during_delete_keeps_card_stale(fake_render, monkeypatch):
+    common._bump_data_generation(2)
+
+    def render_while_deleting(mid, user_data):
+        common._bump_data_generation(mid)
+        common._forget_versions(mid)
+        return b'card'
+    monkeypatch.setattr(common, 'render_card', render_while_deleting)
+    common.render_user_card(2)
+    assert not common._is_card_current(2)
@@ -0,0 +1,47 @@
+import pytest
+import web_api
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # 尺寸参数无效时应在加载数据之前返回400
+    def fail(mid):
+        raise AssertionError("参数无效时不应加载数据")
+    monkeypatch.setattr(web_api, 'load_fresh_user_data', fail)
+    return web_api.app.test_client()
+
+
+@pytest.mark.parametrize('query', ['w=99', 'w=abc', 'scale=0', 'scale=-1', 'scale=nan', 'scale=inf', 'scale=1e400'])
+def test_invalid_card_size_returns_400(client, query):
+    response = client.get(f'/card/2?{query}')
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['success'] is False
+    assert body['mid'] == 2
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('w=400', 400),
+    ('w=100', 100),
+    ('w=800', None),
+    ('w=1600', None),
+    ('scale=0.5', 400),
+    ('scale=2', None),
+    ('', None),
+])
+def test_parse_card_width(query, expected):
+    with web_api.app.test_request_context(f'/card/2?{query}'):
+        assert web_api.parse_card_width() == expected
+
+
+class ImmediateExecutor:
+    def submit(self, func, *args):
+        func(*args)
+
+
+def test_background_refresh_does_not_count_access(monkeypatch):
+    calls = []
+    monkeypatch.setattr(web_api, 'refresh_executor', ImmediateExecutor())
+    monkeypatch.setattr(web_api, 'query_user_data', lambda mid, record_access=True: calls.append(record_access) or {})
+    web_api.refresh_in_background(2)
+    assert calls == [False]
@@ -1,23 +1,21 @@
 # web_api.py
-from flask import Flask, jsonify, send_file
-import os
-import json
+from flask import Flask, jsonify, Response, request
+import math
+import hashlib
 import time
 from datetime import datetime
 from collections import deque
 import threading
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 # 导入现有的API模块
-from api.user_info import get_user_info_with_retry
-from api.relation_stat import get_relation_stat_with_retry
-from api.upstat import get_upstat_with_retry
-# 修改绘图导入
-try:
-    from drawing import draw_user_card
-except ImportError:
-    # 回退到旧版本
-    from draw_user_card import draw_user_card
-from common import manage_query_history, delete_user_data  # 导入共享功能
+from api.pipeline import fetch_user_data, merge_user_data
+from api.async_api import fetch_user_data_async
+from common import init_query_history, manage_query_history, update_history_size, record_history_hit, load_user_record, load_user_card, delete_user_data, save_combined_data, ensure_user_card, SingleFlight  # 导入共享功能
+from cache import variant_cache
+from storage import get_snapshot_store
+from drawing import card_mimetype, resize_card, CARD_WIDTH
 
 app = Flask(__name__)
 
@@ -25,6 +23,33 @@ app = Flask(__name__)
 global_cookie = None
 global_headers = None
 
+# 同一个MID的并发查询/绘制只执行一次，其他请求等待并共享结果
+query_flight = SingleFlight()
+render_flight = SingleFlight()
+variant_flight = SingleFlight()
+
+# /history/<mid> 返回的增长统计窗口（秒）
+GROWTH_WINDOWS = {'1d': 24 * 60 * 60, '7d': 7 * 24 * 60 * 60, '30d': 30 * 24 * 60 * 60}
+
+# 数据新鲜度：TTL内直接返回；超过TTL先返回旧数据并在后台刷新；超过硬上限时同步重新查询
+DATA_TTL = 10 * 60               # 秒
+DATA_HARD_TTL = 24 * 60 * 60     # 秒
+REFRESH_WORKERS = 4              # 后台刷新线程数
+
+# 卡片按需生成：查询数据时不绘制卡片，请求 /card/<mid> 时才绘制；
+# 开启CARD_PRERENDER时，数据更新后由一个后台线程依次预先绘制（低优先级，最多占用一个渲染进程）
+CARD_PRERENDER = False
+
+# 卡片缩略图的最小宽度（像素）；最大宽度为完整卡片的宽度，更大的请求返回完整卡片
+CARD_MIN_WIDTH = 100
+
+refresh_executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix='bili-refresh')
+refreshing_mids = set()
+refreshing_lock = threading.Lock()
+prerender_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='bili-prerender')
+prerendering_mids = set()
+prerendering_lock = threading.Lock()
+
 def load_cookie():
     """
     从cookie.txt文件加载Cookie信息
@@ -55,107 +80,186 @@ def create_headers(cookie):
     }
     return headers
 
-def save_combined_data(mid, user_info, relation_stat, upstat_data):
+def query_user_data(mid, record_access=True):
     """
-    保存合并后的数据到一个文件
+    并发查询用户数据，每个API都有重试机制
+    record_access为False时不计入查询历史的访问次数（后台刷新或调用者已记录过访问）
     """
-    # 创建data目录
-    if not os.path.exists('data'):
-        os.makedirs('data')
+    global global_headers
+    
+    if not global_headers:
+        return {"error": "未加载Cookie信息，请检查cookie.txt文件"}
+    
+    print(f"开始查询用户 {mid} 的数据...")
+    
+    # 管理查询历史记录
+    manage_query_history(mid, record_access)
     
-    # 合并所有数据
-    combined_data = {}
+    # 1-3. 并发查询用户基本信息、关注粉丝数量、播放点赞数量（带重试）
+    print("1-3. 并发查询用户基本信息、关注粉丝数量、播放点赞数量...")
+    user_info, relation_stat, upstat_data = fetch_user_data(mid, global_headers)
+    if not user_info:
+        return {"error": "用户基本信息查询失败"}
     
-    # 添加用户基本信息
-    if user_info:
-        combined_data.update(user_info)
+    if not relation_stat:
+        return {"error": "关注粉丝数据查询失败"}
     
-    # 添加关系数据
-    if relation_stat:
-        combined_data.update(relation_stat)
+    if not upstat_data:
+        return {"error": "播放点赞数据查询失败"}
     
-    # 添加统计数据
-    if upstat_data:
-        combined_data.update(upstat_data)
+    # 4. 保存合并后的数据
+    print("4. 保存数据...")
+    fetched_at = time.time()
+    if not save_combined_data(mid, user_info, relation_stat, upstat_data, fetched_at):
+        return {"error": "数据保存失败"}
     
-    filename = f"data/{mid}_data.json"
+    # 卡片在请求 /card/<mid> 时按需生成
+    prerender_in_background(mid)
     
-    try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(combined_data, f, ensure_ascii=False, indent=2)
-        print(f"数据已保存到: {filename}")
-        return True
-    except Exception as e:
-        print(f"保存数据时出错: {e}")
-        return False
+    # 更新磁盘占用，必要时淘汰其他用户数据
+    update_history_size(mid)
+    
+    print(f"用户 {mid} 的所有数据查询完成！")
+    
+    # 返回合并数据
+    combined_data = merge_user_data(user_info, relation_stat, upstat_data)
+    combined_data['fetched_at'] = fetched_at
+    return combined_data
 
-def query_user_data(mid):
+async def query_user_data_async(mid, headers=None, record_access=True):
     """
-    按顺序查询用户数据，每个API都有重试机制
+    query_user_data的异步版本：网络请求在事件循环中并发执行，
+    写文件等阻塞操作放到线程池，一个事件循环可以同时处理大量查询
+    （供在事件循环中批量查询的调用者使用，Web API的路由使用同步版本）
     """
-    global global_headers
+    headers = headers or global_headers
     
-    if not global_headers:
+    if not headers:
         return {"error": "未加载Cookie信息，请检查cookie.txt文件"}
     
     print(f"开始查询用户 {mid} 的数据...")
+    loop = asyncio.get_running_loop()
     
     # 管理查询历史记录
-    manage_query_history(mid)
+    await loop.run_in_executor(None, manage_query_history, mid, record_access)
     
-    # 1. 查询用户基本信息（带重试）
-    print("1. 查询用户基本信息...")
-    user_info = get_user_info_with_retry(mid, global_headers)
+    # 1-3. 并发查询用户基本信息、关注粉丝数量、播放点赞数量（带重试）
+    print("1-3. 并发查询用户基本信息、关注粉丝数量、播放点赞数量...")
+    user_info, relation_stat, upstat_data = await fetch_user_data_async(mid, headers)
     if not user_info:
         return {"error": "用户基本信息查询失败"}
     
-    # 2. 查询关注和粉丝数量（带重试）
-    print("2. 查询关注和粉丝数量...")
-    relation_stat = get_relation_stat_with_retry(mid, global_headers)
     if not relation_stat:
         return {"error": "关注粉丝数据查询失败"}
     
-    # 3. 查询播放和点赞数量（带重试）
-    print("3. 查询播放和点赞数量...")
-    upstat_data = get_upstat_with_retry(mid, global_headers)
     if not upstat_data:
         return {"error": "播放点赞数据查询失败"}
     
     # 4. 保存合并后的数据
     print("4. 保存数据...")
-    if not save_combined_data(mid, user_info, relation_stat, upstat_data):
+    fetched_at = time.time()
+    if not await loop.run_in_executor(None, save_combined_data, mid, user_info, relation_stat, upstat_data, fetched_at):
         return {"error": "数据保存失败"}
     
-    # 5. 生成用户信息卡片
-    print("5. 生成用户信息卡片...")
-    if not draw_user_card(mid):
-        return {"error": "生成用户卡片失败"}
+    # 卡片在请求 /card/<mid> 时按需生成
+    prerender_in_background(mid)
+    
+    # 更新磁盘占用，必要时淘汰其他用户数据
+    await loop.run_in_executor(None, update_history_size, mid)
     
     print(f"用户 {mid} 的所有数据查询完成！")
     
     # 返回合并数据
-    combined_data = {}
-    combined_data.update(user_info)
-    combined_data.update(relation_stat)
-    combined_data.update(upstat_data)
-    
+    combined_data = merge_user_data(user_info, relation_stat, upstat_data)
+    combined_data['fetched_at'] = fetched_at
     return combined_data
 
 def load_user_data_from_file(mid):
     """
-    从文件加载用户数据
+    加载用户数据，优先使用内存缓存，未命中时从存储后端读取并写入缓存
     """
-    data_file = f"data/{mid}_data.json"
-    if not os.path.exists(data_file):
-        return None
+    return load_user_record(mid)
+
+def load_card_bytes(mid):
+    """
+    加载用户卡片图片字节，优先使用内存缓存，未命中时从文件读取并写入缓存
+    """
+    return load_user_card(mid)
+
+def refresh_in_background(mid):
+    """
+    在后台线程中重新查询用户数据，同一个MID同时只有一个刷新任务
+    """
+    with refreshing_lock:
+        if mid in refreshing_mids:
+            return
+        refreshing_mids.add(mid)
     
-    try:
-        with open(data_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return data
-    except Exception as e:
-        print(f"加载数据文件失败: {e}")
-        return None
+    def refresh():
+        try:
+            print(f"用户 {mid} 数据已过期，后台刷新中...")
+            # 后台刷新不是用户访问，不影响LRU/LFU统计
+            result = query_flight.do(mid, query_user_data, mid, record_access=False)
+            if "error" in result:
+                print(f"后台刷新用户 {mid} 数据失败: {result['error']}")
+        except Exception as e:
+            print(f"后台刷新用户 {mid} 数据出错: {e}")
+        finally:
+            with refreshing_lock:
+                refreshing_mids.discard(mid)
+    
+    refresh_executor.submit(refresh)
+
+def prerender_in_background(mid):
+    """
+    开启CARD_PRERENDER时在后台预先绘制卡片，同一个MID同时只有一个任务
+    """
+    if not CARD_PRERENDER:
+        return
+    with prerendering_lock:
+        if mid in prerendering_mids:
+            return
+        prerendering_mids.add(mid)
+    
+    def prerender():
+        try:
+            render_flight.do(mid, ensure_user_card, mid)
+        except Exception as e:
+            print(f"后台绘制用户 {mid} 卡片出错: {e}")
+        finally:
+            with prerendering_lock:
+                prerendering_mids.discard(mid)
+    
+    prerender_executor.submit(prerender)
+
+def load_fresh_user_data(mid):
+    """
+    按新鲜度加载用户数据：
+    - TTL内：直接返回已保存的数据
+    - 超过TTL但未超过硬上限：立即返回旧数据，同时在后台刷新
+    - 超过硬上限或没有数据：同步重新查询（查询失败时退回旧数据）
+    返回用户数据，或包含error字段的dict
+    """
+    user_data = load_user_data_from_file(mid)
+    
+    if user_data is not None:
+        record_history_hit(mid)
+        age = time.time() - user_data.get('fetched_at', 0)
+        if age <= DATA_TTL:
+            return user_data
+        if age <= DATA_HARD_TTL:
+            refresh_in_background(mid)
+            return user_data
+        print(f"用户 {mid} 数据超过 {DATA_HARD_TTL} 秒未更新，重新查询...")
+    else:
+        print(f"数据文件不存在，开始查询用户 {mid} 数据...")
+    
+    # 已有数据时本次访问已经由record_history_hit记录
+    result = query_flight.do(mid, query_user_data, mid, record_access=user_data is None)
+    if "error" in result and user_data is not None:
+        print(f"重新查询失败，返回旧数据: {result['error']}")
+        return user_data
+    return result
 
 @app.route('/')
 def index():
@@ -167,6 +271,7 @@ def index():
         "usage": {
             "query_user": "/<mid> - 查询指定MID的用户数据",
             "get_card": "/card/<mid> - 获取用户信息卡片图片",
+            "get_history": "/history/<mid> - 获取粉丝数、关注数、播放量、点赞数的历史记录和增长量",
             "example": "/2 - 查询MID为2的用户数据"
         },
         "status": "running"
@@ -178,39 +283,21 @@ def get_user_data(mid):
     获取用户数据的API接口
     """
     try:
-        # 首先尝试从文件加载数据
-        user_data = load_user_data_from_file(mid)
+        # 加载数据（不存在或过期时重新查询）
+        user_data = load_fresh_user_data(mid)
         
-        if user_data is None:
-            # 如果文件不存在，查询用户数据
-            print(f"数据文件不存在，开始查询用户 {mid} 数据...")
-            result = query_user_data(mid)
-            
-            # 检查是否有错误
-            if "error" in result:
-                return jsonify({
-                    "success": False,
-                    "error": result["error"],
-                    "mid": mid
-                }), 400
-            
-            user_data = result
+        # 检查是否有错误
+        if "error" in user_data:
+            return jsonify({
+                "success": False,
+                "error": user_data["error"],
+                "mid": mid
+            }), 400
         
-        # 添加卡片下载链接到数据中
+        # 添加卡片下载链接到数据中（卡片在请求该链接时才生成）
         user_data_with_card = user_data.copy()
         user_data_with_card["card_image_url"] = f"http://127.0.0.1:12561/card/{mid}"
         
-        # 确保卡片存在
-        card_path = f"output/{mid}.png"
-        if not os.path.exists(card_path):
-            print(f"卡片不存在，重新生成用户 {mid} 卡片...")
-            if not draw_user_card(mid):
-                return jsonify({
-                    "success": False,
-                    "error": "生成用户卡片失败",
-                    "mid": mid
-                }), 500
-        
         # 返回成功结果
         return jsonify({
             "success": True,
@@ -226,39 +313,98 @@ def get_user_data(mid):
             "mid": mid
         }), 500
 
+def parse_card_width():
+    """
+    解析卡片请求的 ?w=宽度 或 ?scale=比例 参数，返回目标宽度（None表示完整尺寸），参数无效时抛出ValueError
+    高于完整尺寸的请求返回完整卡片（卡片布局按800像素宽绘制，不支持更高分辨率）
+    """
+    width = request.args.get('w')
+    scale = request.args.get('scale')
+    if width is not None:
+        width = int(width)
+    elif scale is not None:
+        scale = float(scale)
+        # nan/inf会让round抛出OverflowError，按参数无效处理
+        if not math.isfinite(scale) or not scale > 0:
+            raise ValueError("scale必须是大于0的有限数")
+        width = round(CARD_WIDTH * scale)
+    else:
+        return None
+    
+    if width < CARD_MIN_WIDTH:
+        raise ValueError(f"宽度不能小于{CARD_MIN_WIDTH}")
+    if width >= CARD_WIDTH:
+        return None
+    return width
+
+def load_card_variant(mid, card_bytes, width):
+    """
+    获取缩小到指定宽度的卡片，由完整卡片缩放得到并缓存
+    """
+    mimetype = card_mimetype()
+    key = (mid, hashlib.blake2b(card_bytes, digest_size=16).hexdigest(), width, mimetype)
+    variant = variant_cache.get(key)
+    if variant is not None:
+        return variant
+    
+    # 同一尺寸的并发请求只缩放一次
+    variant = variant_flight.do(key, resize_card, card_bytes, width)
+    if variant is not None:
+        variant_cache.put(key, variant, len(variant))
+    return variant
+
 @app.route('/card/<int:mid>')
 def get_user_card(mid):
     """
-    获取用户信息卡片图片
+    获取用户信息卡片图片，可通过 ?w=宽度 或 ?scale=比例 获取缩小尺寸的卡片
     """
     try:
-        # 检查卡片文件是否存在
-        card_path = f"output/{mid}.png"
-        if not os.path.exists(card_path):
-            # 如果卡片不存在，检查数据是否存在
-            data_file = f"data/{mid}_data.json"
-            if not os.path.exists(data_file):
-                # 如果数据也不存在，先查询数据
-                print(f"数据文件不存在，开始查询用户 {mid} 数据...")
-                result = query_user_data(mid)
-                if "error" in result:
-                    return jsonify({
-                        "success": False,
-                        "error": result["error"],
-                        "mid": mid
-                    }), 400
-            else:
-                # 数据存在但卡片不存在，重新生成卡片
-                print(f"数据文件存在，重新生成用户 {mid} 卡片...")
-                if not draw_user_card(mid):
-                    return jsonify({
-                        "success": False,
-                        "error": "生成用户卡片失败",
-                        "mid": mid
-                    }), 500
+        try:
+            width = parse_card_width()
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": f"无效的尺寸参数: {e}",
+                "mid": mid
+            }), 400
         
-        # 返回图片文件
-        return send_file(card_path, mimetype='image/png')
+        # 加载数据（不存在或过期时重新查询）
+        user_data = load_fresh_user_data(mid)
+        if "error" in user_data:
+            return jsonify({
+                "success": False,
+                "error": user_data["error"],
+                "mid": mid
+            }), 400
+        
+        # 按需生成卡片：卡片不存在或数据更新后内容有变化时重新绘制
+        if not render_flight.do(mid, ensure_user_card, mid):
+            return jsonify({
+                "success": False,
+                "error": "生成用户卡片失败",
+                "mid": mid
+            }), 500
+        
+        # 优先使用内存缓存，未命中时读取文件
+        card_bytes = load_card_bytes(mid)
+        if card_bytes is None:
+            return jsonify({
+                "success": False,
+                "error": "卡片文件不存在",
+                "mid": mid
+            }), 500
+        
+        # 缩小尺寸的卡片由完整卡片缩放得到
+        if width is not None:
+            card_bytes = load_card_variant(mid, card_bytes, width)
+            if card_bytes is None:
+                return jsonify({
+                    "success": False,
+                    "error": "生成缩小尺寸的卡片失败",
+                    "mid": mid
+                }), 500
+        
+        return Response(card_bytes, mimetype=card_mimetype())
         
     except Exception as e:
         return jsonify({
@@ -267,6 +413,38 @@ def get_user_card(mid):
             "mid": mid
         }), 500
 
+@app.route('/history/<int:mid>')
+def get_user_history(mid):
+    """
+    获取用户计数的历史快照和最近1天/7天/30天的增长量
+    """
+    try:
+        store = get_snapshot_store()
+        series = store.get_series(mid)
+        if not series['timestamp']:
+            return jsonify({
+                "success": False,
+                "error": "没有该用户的历史数据",
+                "mid": mid
+            }), 404
+        
+        growth = {name: store.growth([mid], window).get(mid)
+                  for name, window in GROWTH_WINDOWS.items()}
+        return jsonify({
+            "success": True,
+            "mid": mid,
+            "series": series,
+            "growth": growth,
+            "timestamp": datetime.now().isoformat()
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"服务器内部错误: {str(e)}",
+            "mid": mid
+        }), 500
+
 def initialize():
     """
     初始化函数，在应用上下文中加载Cookie
@@ -274,6 +452,9 @@ def initialize():
     global global_cookie, global_headers
     print("正在初始化Web API服务...")
     
+    # 加载查询历史（之后只在内存中维护，后台定期写回文件）
+    init_query_history()
+    
     # 加载Cookie
     global_cookie = load_cookie()
     if global_cookie: